@@ -0,0 +1,181 @@
+"""
+Measures how the compiler scales with the size of its input.
+Run from the project root: python -m bench.compile_bench --help
+"""
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+from bench.synthetic import CASES, ENTRY_FILE_NAME
+from main import create_compiler
+from src.context.options_ctx import OptionsCtx
+from src.defs.constants import OBJ_FILE_EXT
+from src.gen.generate import generate_module, generate_start_module, module_artifact_path
+from src.gen.make_executable import compile_objects, get_runtime_obj_files, make_executables
+from src.loader import Loader
+from src.normalize import normalize, create_normalize_pass_manager
+from src.normalize.pass_manager import PassManager
+
+PHASES = ["parse", "resolve", "typecheck", "gen", "make_executable"]
+DEFAULT_BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+# differences below these are noise, whatever the threshold is
+MIN_SECONDS_DIFF = 0.005
+MIN_BYTES_DIFF = 64 * 1024
+
+# case -> phase -> {"seconds": ..., "peak_bytes": ...}
+Results = Dict[str, Dict[str, Dict[str, float]]]
+
+
+class PhaseMeter:
+    """
+    Measures wall time of every phase, and the peak of Python allocations if tracemalloc is tracing.
+    Memory allocated by LLVM and clang is not visible to it.
+    """
+    results: Dict[str, Dict[str, float]]
+
+    def __init__(self):
+        self.results = dict()
+
+    @contextmanager
+    def phase(self, name: str):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        self.results[name] = {"seconds": time.perf_counter() - start}
+        if tracing:
+            self.results[name]["peak_bytes"] = tracemalloc.get_traced_memory()[1] - start_bytes
+
+
+def compile_program(root: Path, meter: PhaseMeter):
+    compiler = create_compiler(root, OptionsCtx(use_cache=False, jobs=1))
+    compiler.project.build_dir().mkdir(exist_ok=True)
+    passes = create_normalize_pass_manager().passes
+    resolved = next(i for i, p in enumerate(passes) if p.name == "resolve") + 1
+    # the phases run over all modules one after another, normalize goes in the import order
+    resolve_pm, typecheck_pm = PassManager(passes[:resolved]), PassManager(passes[resolved:])
+
+    with meter.phase("parse"):
+        loader = Loader(compiler)
+        entry = loader.load_file(root / ENTRY_FILE_NAME)
+        modules = loader.get_loaded_modules()
+    with meter.phase("resolve"):
+        for mod in modules:
+            normalize(compiler, mod, is_entry=mod == entry, pm=resolve_pm)
+    with meter.phase("typecheck"):
+        for mod in modules:
+            normalize(compiler, mod, is_entry=mod == entry, pm=typecheck_pm)
+    with meter.phase("gen"):
+        ir_jobs = [(str(generate_module(compiler, mod)), {"obj": module_artifact_path(compiler, mod, OBJ_FILE_EXT)})
+                   for mod in modules]
+        start_file = compiler.project.build_dir() / ("program.start" + OBJ_FILE_EXT)
+        ir_jobs.append((str(generate_start_module(entry.path)), {"obj": start_file}))
+    with meter.phase("make_executable"):
+        compile_objects(compiler, ir_jobs)
+        obj_files = get_runtime_obj_files(compiler) + [obj_file["obj"] for _, obj_file in ir_jobs]
+        make_executables(compiler, [(obj_files, compiler.project.build_dir() / "program")])
+
+
+def run_case(name: str, scale: float, repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Time is the best of the runs, memory is measured in one more run under tracemalloc, which slows it down.
+    """
+    generator, size = CASES[name]
+    sources = generator(max(1, int(size * scale)))
+    with tempfile.TemporaryDirectory(prefix=f"herb-bench-{name}-") as tmp:
+        root = Path(tmp)
+        for file_name, source in sources.items():
+            (root / file_name).write_text(source, encoding="utf-8")
+
+        results = {phase: {"seconds": float("inf")} for phase in PHASES}
+        for _ in range(repeat):
+            meter = PhaseMeter()
+            compile_program(root, meter)
+            for phase, measured in meter.results.items():
+                results[phase]["seconds"] = min(results[phase]["seconds"], measured["seconds"])
+
+        meter = PhaseMeter()
+        tracemalloc.start()
+        try:
+            compile_program(root, meter)
+        finally:
+            tracemalloc.stop()
+        for phase, measured in meter.results.items():
+            results[phase]["peak_bytes"] = measured["peak_bytes"]
+    return results
+
+
+def find_regressions(results: Results, baseline: Results, threshold: float) -> List[str]:
+    regressions = []
+    for case, phases in results.items():
+        for phase, measured in phases.items():
+            base = baseline.get(case, {}).get(phase)
+            if base is None:
+                continue
+            for metric, min_diff in [("seconds", MIN_SECONDS_DIFF), ("peak_bytes", MIN_BYTES_DIFF)]:
+                diff = measured[metric] - base[metric]
+                if diff > min_diff and diff > base[metric] * threshold:
+                    regressions.append(f"{case}/{phase}: {metric} {base[metric]:.6g} -> {measured[metric]:.6g} "
+                                       f"(+{100 * diff / base[metric]:.0f}%)")
+    return regressions
+
+
+def print_results(results: Results):
+    print(f"{'case':<20} {'phase':<16} {'time, ms':>10} {'peak, KiB':>10}")
+    for case, phases in results.items():
+        for phase, measured in phases.items():
+            print(f"{case:<20} {phase:<16} {measured['seconds'] * 1000:10.2f} {measured['peak_bytes'] / 1024:10.0f}")
+
+
+def main():
+    argparser = ArgumentParser(prog="python -m bench.compile_bench",
+                               description="Compile synthetic programs and measure every phase of the compiler")
+    argparser.add_argument("cases", nargs="*", metavar="case",
+                           help=f"cases to run, all by default: {', '.join(CASES)}")
+    argparser.add_argument("--scale", type=float, default=1.0, help="multiplies the size of every program")
+    argparser.add_argument("--repeat", type=int, default=3, help="time is the best of this many runs")
+    argparser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE_PATH, help="baseline JSON file")
+    argparser.add_argument("--save-baseline", action="store_true",
+                           help="store the results as the new baseline instead of comparing with it")
+    argparser.add_argument("--threshold", type=float, default=0.25,
+                           help="allowed relative slowdown or memory growth of a phase before it is a regression")
+    args = argparser.parse_args()
+    unknown_cases = [case for case in args.cases if case not in CASES]
+    if len(unknown_cases) > 0:
+        print(f"ERROR: Unknown cases: {', '.join(unknown_cases)}")
+        sys.exit(1)
+
+    results = {case: run_case(case, args.scale, args.repeat) for case in (args.cases or CASES)}
+    print_results(results)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({"scale": args.scale, "cases": results}, indent=2), encoding="utf-8")
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+    if not args.baseline.is_file():
+        print(f"\nNo baseline at {args.baseline}, run with --save-baseline to create one")
+        return
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline["scale"] != args.scale:
+        print(f"\nERROR: The baseline was measured at scale {baseline['scale']}, not {args.scale}")
+        sys.exit(1)
+    regressions = find_regressions(results, baseline["cases"], args.threshold)
+    if len(regressions) > 0:
+        print(f"\nREGRESSIONS over {args.threshold:.0%}:")
+        for r in regressions:
+            print(f"  {r}")
+        sys.exit(1)
+    print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
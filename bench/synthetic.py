@@ -0,0 +1,96 @@
+"""
+Generators of synthetic Herb programs that stress one dimension of the compiler each.
+Every generator returns the sources of a program: file name relative to the project root -> source,
+the entry file is ENTRY_FILE_NAME.
+"""
+from typing import Dict
+
+ENTRY_FILE_NAME = "main.herb"
+
+
+def many_functions(n: int) -> Dict[str, str]:
+    """
+    n small functions that call the previous one.
+    """
+    lines = ["fn f0(x: int) -> int {", "    return x + 1;", "}", ""]
+    for i in range(1, n):
+        lines += [
+            f"fn f{i}(x: int) -> int {{",
+            f"    var y = f{i - 1}(x) * 3 % 1000;",
+            "    if y > 500 {",
+            "        return y - 1;",
+            "    }",
+            "    return y + 1;",
+            "}",
+            "",
+        ]
+    lines += ["entrypoint {", f"    print(f{n - 1}(1));", "}"]
+    return {ENTRY_FILE_NAME: "\n".join(lines)}
+
+
+def deep_nesting(depth: int) -> Dict[str, str]:
+    """
+    Alternating if and while statements nested depth times.
+    """
+    lines = ["entrypoint {", "    var x = 0;"]
+    indent = "    "
+    for i in range(depth):
+        if i % 2 == 0:
+            lines.append(f"{indent}if x < {depth} {{")
+        else:
+            lines.append(f"{indent}while x < {i} {{")
+        indent += "    "
+        lines.append(f"{indent}x = x + 1;")
+    for _ in range(depth):
+        indent = indent[:-4]
+        lines.append(f"{indent}}}")
+    lines += ["    print(x);", "}"]
+    return {ENTRY_FILE_NAME: "\n".join(lines)}
+
+
+def long_binop_chain(length: int) -> Dict[str, str]:
+    """
+    One expression of length terms.
+    """
+    ops = ["+", "-", "*", "+"]
+    expr = "x"
+    for i in range(1, length):
+        expr += f" {ops[i % len(ops)]} {i % 7 + 1}"
+    src = "\n".join([
+        "entrypoint {",
+        "    var x = 1;",
+        f"    var y = {expr};",
+        "    print(y);",
+        "}",
+    ])
+    return {ENTRY_FILE_NAME: src}
+
+
+def wide_imports(width: int) -> Dict[str, str]:
+    """
+    The entry imports width modules, each of them imports a shared module.
+    """
+    sources = {"shared.herb": "var BASE = 7;\n\nfn base() -> int {\n    return BASE;\n}\n"}
+    entry = []
+    calls = []
+    for i in range(width):
+        sources[f"m{i}.herb"] = "\n".join([
+            "import .shared;",
+            "",
+            "fn value() -> int {",
+            f"    return shared.base() + {i};",
+            "}",
+        ])
+        entry.append(f"import .m{i};")
+        calls.append(f"    sum = sum + m{i}.value();")
+    sources[ENTRY_FILE_NAME] = "\n".join(entry + ["", "entrypoint {", "    var sum = 0;", *calls, "    print(sum);", "}"])
+    return sources
+
+
+# case name -> (generator, size at scale 1)
+CASES = {
+    "many_functions": (many_functions, 1000),
+    "deep_nesting": (deep_nesting, 40),
+    "long_binop_chain": (long_binop_chain, 100),
+    "wide_imports": (wide_imports, 200),
+}
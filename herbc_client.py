@@ -0,0 +1,6 @@
+import sys
+
+from src.daemon.client import main
+
+if __name__ == "__main__":
+    exit(main(sys.argv[1:]))
@@ -1,72 +1,584 @@
+import dataclasses
 import os.path
 import sys
 from pathlib import Path
-from argparse import ArgumentParser
+from argparse import ArgumentParser, Namespace
+from typing import List, Tuple, Dict, TYPE_CHECKING
 
-from src.defs.constants import RUNTIME_DIR_NAME, HERB_STD_DIR_NAME, HERB_STD_PACKAGE_NAME
-from src.normalize import normalize
+from src.ast import Module
+from src.cache.ast_cache import disk_ast_cache
+from src.cache.build_cache import BuildCache
+from src.defs.constants import RUNTIME_DIR_NAME, HERB_STD_DIR_NAME, HERB_STD_PACKAGE_NAME, HERB_FILE_EXT, \
+    EMIT_EXE, EMIT_FILE_EXTS, STATIC_LIB_EXT, SHARED_LIB_EXT, BUILD_DIR_NAME, PARSERS, PARSER_NATIVE, \
+    RECURSION_LIMIT
+from src.normalize import normalize, create_normalize_pass_manager
+from src.normalize.pass_manager import PassManager, PassTimer
 from src.context.compilation_ctx import CompilationCtx
+from src.context.options_ctx import OptionsCtx
+from src.defs.passes import OPT_PASSES
 from src.context.project_ctx import ProjectCtx
 from src.context.error_ctx import CompilationInterrupted, ErrorCtx
-from src.gen.generate import generate
+from src.daemon.protocol import default_socket_path
+from src.daemon.server import DaemonFailed, serve
+from src.benchmark import BenchFailed, BenchResults, run_benchmark, format_results, save_results, load_results, \
+    find_regressions
+from src.memory_report import MemoryReport
+from src.profiler import Profiler, PSTATS_FILE_EXT, TRACE_FILE_EXT
+from src.library.manifest import LibraryManifest, load_manifest, write_manifest
 from src.loader import Loader
 
+if TYPE_CHECKING:
+    from src.gen.jit import JitProgram
+
 
 COMPILER_PATH = Path(os.path.abspath(__file__)).parent
 RT_PATH = COMPILER_PATH / RUNTIME_DIR_NAME
 HERB_STD_PATH = COMPILER_PATH / HERB_STD_DIR_NAME
+BENCH_PROGRAMS_PATH = COMPILER_PATH / "bench" / "programs"
+
+
+def main(argv: List[str] | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), RECURSION_LIMIT))
+    if len(argv) > 0 and argv[0] == "--daemon":
+        daemon_main(argv[1:])
+    elif len(argv) > 0 and argv[0] == "--lib":
+        lib_main(argv[1:])
+    elif len(argv) > 0 and argv[0] in COMMANDS:
+        COMMANDS[argv[0]](argv[1:])
+    else:
+        build_main(argv)
 
 
-def main():
-    argparser = ArgumentParser(prog="herbc", description="Herb Compiler")
+def build_main(argv: List[str]):
+    argparser = ArgumentParser(prog="herbc", description="Herb Compiler",
+                               epilog=f"other commands: {', '.join(COMMANDS)} (see herbc <command> --help); "
+                                      "herbc --lib builds a package into a library, see herbc --lib --help; "
+                                      "herbc --daemon starts a compiler server, see herbc --daemon --help")
     argparser.add_argument("herb_file")
     argparser.add_argument("output_file", nargs="?")
+    argparser.add_argument("--check", action="store_true",
+                           help="only check the program for errors, no code is generated")
+    argparser.add_argument("--no-cache", action="store_true", help="rebuild every module from scratch")
+    argparser.add_argument("-j", "--jobs", type=int, default=OptionsCtx.jobs,
+                           help="number of processes that parse the files and compile the modules to object files, "
+                                "at most one per CPU is used for parsing")
+    add_output_arguments(argparser)
+    add_codegen_arguments(argparser)
 
-    args = argparser.parse_args(sys.argv[1:])
-    entry_file_path = Path(args.herb_file)
-
-    if not entry_file_path.is_file():
-        print(f"ERROR: {entry_file_path}: File not found")
+    args = argparser.parse_args(argv)
+    entry_file_path = check_entry_file(args.herb_file)
+    if args.jobs < 1:
+        print(f"ERROR: --jobs must be positive, but was {args.jobs}")
         exit(1)
 
+    if args.check:
+        ok = run_checker([entry_file_path], OptionsCtx(use_cache=not args.no_cache, jobs=args.jobs,
+                                                       parser=args.parser, time_passes=args.time_passes,
+                                                       mem_report=args.mem_report, profile=args.profile,
+                                                       libraries=parse_libraries(args)))
+        if not ok:
+            exit(1)
+        return
+
     if args.output_file is not None:
         output_file_path = Path(args.output_file)
     else:
         output_file_path = entry_file_path.parent / entry_file_path.stem
 
-    ok = run_compiler(entry_file_path, output_file_path)
+    options = OptionsCtx(use_cache=not args.no_cache, jobs=args.jobs, opt_level=args.opt_level,
+                         passes=parse_passes(args), parser=args.parser, time_passes=args.time_passes,
+                         mem_report=args.mem_report, profile=args.profile, emit=parse_emit(args), lto=args.lto,
+                         libraries=parse_libraries(args))
+    ok = run_compiler(entry_file_path, output_file_path, options)
     if not ok:
         exit(1)
 
 
-def run_compiler(filepath: Path, outpath: Path) -> bool:
-    compiler = CompilationCtx(
+def batch_main(argv: List[str]):
+    argparser = ArgumentParser(prog="herbc build",
+                               description="Compile several programs, sharing the modules they import. "
+                                           "Every file must define an entrypoint.")
+    argparser.add_argument("inputs", nargs="+", metavar="herb_file_or_dir",
+                           help="entry files, directories (all their .herb files) or glob patterns")
+    argparser.add_argument("-o", "--out-dir", type=Path,
+                           help="directory for the executables, by default they are placed next to the entry files")
+    argparser.add_argument("--check", action="store_true",
+                           help="only check the programs for errors, no code is generated")
+    argparser.add_argument("--no-cache", action="store_true", help="rebuild every module from scratch")
+    argparser.add_argument("-j", "--jobs", type=int, default=OptionsCtx.jobs,
+                           help="number of processes that parse the files and compile the modules to object files, "
+                                "at most one per CPU is used for parsing")
+    add_output_arguments(argparser)
+    add_codegen_arguments(argparser)
+
+    args = argparser.parse_args(argv)
+    entries = expand_inputs(args.inputs)
+    if len(entries) == 0:
+        print("ERROR: No .herb files found")
+        exit(1)
+    if args.jobs < 1:
+        print(f"ERROR: --jobs must be positive, but was {args.jobs}")
+        exit(1)
+    if args.out_dir is not None and not args.check:
+        args.out_dir.mkdir(parents=True, exist_ok=True)
+
+    # relative imports are resolved against the directory of the entry file, so programs are grouped by it
+    projects: Dict[Path, List[Tuple[Path, Path]]] = dict()
+    for entry in entries:
+        out_dir = args.out_dir if args.out_dir is not None else entry.parent
+        projects.setdefault(entry.parent, []).append((entry, out_dir / entry.stem))
+
+    options = OptionsCtx(use_cache=not args.no_cache, jobs=args.jobs, opt_level=args.opt_level,
+                         passes=parse_passes(args), parser=args.parser, time_passes=args.time_passes,
+                         mem_report=args.mem_report, profile=args.profile, emit=parse_emit(args), lto=args.lto,
+                         libraries=parse_libraries(args))
+    ok = True
+    for i, programs in enumerate(projects.values()):
+        if options.profile is not None and len(projects) > 1:
+            # every project is compiled separately and gets profiles of its own
+            options = dataclasses.replace(options, profile=args.profile.with_name(f"{args.profile.name}.{i}"))
+        if args.check:
+            ok &= run_checker([entry for entry, _ in programs], options)
+        else:
+            ok &= run_batch_compiler(programs, options)
+    if not ok:
+        exit(1)
+
+
+def expand_inputs(inputs: List[str]) -> List[Path]:
+    entries = []
+    for i in inputs:
+        path = Path(i)
+        if path.is_dir():
+            entries.extend(sorted(path.glob("*" + HERB_FILE_EXT)))
+        elif path.is_file():
+            entries.append(path)
+        else:
+            matches = sorted(p for p in Path().glob(i) if p.is_file()) if not path.is_absolute() else []
+            if len(matches) == 0:
+                print(f"ERROR: {i}: File not found")
+                exit(1)
+            entries.extend(matches)
+    # the same file can be given twice
+    unique = dict()
+    for entry in entries:
+        unique.setdefault(entry.absolute(), entry)
+    return list(unique.values())
+
+
+def run_main(argv: List[str]):
+    argparser = ArgumentParser(prog="herbc run", description="Compile a Herb program in memory and execute it")
+    argparser.add_argument("herb_file")
+    add_codegen_arguments(argparser)
+
+    args = argparser.parse_args(argv)
+    entry_file_path = check_entry_file(args.herb_file)
+
+    options = OptionsCtx(use_cache=False, opt_level=args.opt_level, passes=parse_passes(args),
+                         parser=args.parser, time_passes=args.time_passes, mem_report=args.mem_report,
+                         profile=args.profile)
+    ok = run_jit(entry_file_path, options)
+    if not ok:
+        exit(1)
+
+
+def daemon_main(argv: List[str]):
+    argparser = ArgumentParser(prog="herbc --daemon",
+                               description="Serve compilation requests of 'python herbc_client.py <args>' "
+                                           "over a Unix socket, keeping the compiler warm between them")
+    argparser.add_argument("--socket", type=Path, default=default_socket_path(),
+                           help="socket path, defaults to $HERBC_SOCKET, $XDG_RUNTIME_DIR/herbc.sock or a per-user "
+                                "directory in the temp directory; the directory must not be writable by others")
+    args = argparser.parse_args(argv)
+    try:
+        serve(args.socket, main)
+    except DaemonFailed as e:
+        print(f"ERROR: {e.message}")
+        exit(1)
+
+
+def bench_main(argv: List[str]):
+    argparser = ArgumentParser(prog="herbc bench",
+                               description="Compile the benchmark programs in several configurations "
+                                           "and measure how fast they run")
+    argparser.add_argument("inputs", nargs="*", metavar="herb_file_or_dir",
+                           help=f"benchmark programs, defaults to {BENCH_PROGRAMS_PATH}")
+    argparser.add_argument("-c", "--configs", default="O0,O2",
+                           help="comma-separated configurations: O<level>, optionally followed by +lto, "
+                                "e.g. O0,O2,O2+lto; the first one is the reference of the speedups")
+    argparser.add_argument("--runs", type=int, default=10, help="measured runs of every program")
+    argparser.add_argument("--warmup", type=int, default=2, help="runs before the measured ones")
+    argparser.add_argument("--baseline", type=Path, help="compare with the results saved by --save-baseline")
+    argparser.add_argument("--save-baseline", type=Path, metavar="PATH", help="save the results")
+    argparser.add_argument("--threshold", type=float, default=0.1,
+                           help="with --baseline, fail if a program got slower by more than this fraction")
+
+    args = argparser.parse_args(argv)
+    if args.runs < 1 or args.warmup < 0:
+        print("ERROR: --runs must be positive and --warmup must not be negative")
+        exit(1)
+    configs = {config.strip(): parse_bench_config(config) for config in args.configs.split(",") if config.strip() != ""}
+    entries = expand_inputs(args.inputs or [str(BENCH_PROGRAMS_PATH)])
+    if len(entries) == 0:
+        print("ERROR: No .herb files found")
+        exit(1)
+
+    projects: Dict[Path, List[Path]] = dict()
+    for entry in entries:
+        projects.setdefault(entry.parent, []).append(entry)
+    executables: Dict[Path, Dict[str, Path]] = {entry: dict() for entry in entries}
+    for config, options in configs.items():
+        for root, project_entries in projects.items():
+            programs = [(entry, root / BUILD_DIR_NAME / f"bench-{config}" / entry.stem) for entry in project_entries]
+            programs[0][1].parent.mkdir(parents=True, exist_ok=True)
+            if not run_batch_compiler(programs, options):
+                exit(1)
+            for entry, outpath in programs:
+                executables[entry][config] = outpath
+
+    try:
+        baseline = load_results(args.baseline) if args.baseline is not None else None
+        results: BenchResults = dict()
+        for entry, config_executables in executables.items():
+            # relative names keep baselines comparable between checkouts
+            program = str(entry.relative_to(COMPILER_PATH) if entry.is_relative_to(COMPILER_PATH) else entry)
+            results[program] = dict()
+            outputs = dict()
+            for config, executable in config_executables.items():
+                results[program][config], outputs[config] = run_benchmark(executable, args.warmup, args.runs)
+            if len(set(outputs.values())) > 1:
+                raise BenchFailed(f"{entry} printed different outputs in different configurations")
+    except BenchFailed as e:
+        print(f"ERROR: {e.message}")
+        exit(1)
+
+    print(format_results(results, baseline))
+    if args.save_baseline is not None:
+        save_results(args.save_baseline, results)
+        print(f"\nResults saved to {args.save_baseline}")
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, args.threshold)
+        if len(regressions) > 0:
+            print(f"\nREGRESSIONS over {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"  {r}")
+            exit(1)
+
+
+def parse_bench_config(config: str) -> OptionsCtx:
+    config = config.strip()
+    level, _, suffix = config.partition("+")
+    if len(level) != 2 or level[0] != "O" or level[1] not in "0123" or suffix not in ("", "lto"):
+        print(f"ERROR: Unknown configuration '{config}', expected O<level> or O<level>+lto")
+        exit(1)
+    return OptionsCtx(opt_level=int(level[1]), lto=suffix == "lto")
+
+
+COMMANDS = {
+    "build": batch_main,
+    "run": run_main,
+    "bench": bench_main,
+}
+
+
+def lib_main(argv: List[str]):
+    argparser = ArgumentParser(prog="herbc --lib",
+                               description="Compile every module of a package into a library and a manifest "
+                                           "of its declarations, programs are linked against it with --library")
+    argparser.add_argument("package_dir", type=Path)
+    argparser.add_argument("output_file", type=Path, nargs="?",
+                           help=f"the library, {STATIC_LIB_EXT} or {SHARED_LIB_EXT}; "
+                                f"the manifest is written next to it; defaults to lib<package>{STATIC_LIB_EXT} "
+                                "in the build directory of the package")
+    argparser.add_argument("--no-cache", action="store_true", help="rebuild every module from scratch")
+    argparser.add_argument("-j", "--jobs", type=int, default=OptionsCtx.jobs,
+                           help="number of processes that parse the files and compile the modules to object files, "
+                                "at most one per CPU is used for parsing")
+    add_codegen_arguments(argparser)
+
+    args = argparser.parse_args(argv)
+    if not args.package_dir.is_dir():
+        print(f"ERROR: {args.package_dir}: Directory not found")
+        exit(1)
+    if args.output_file is None:
+        args.output_file = args.package_dir / BUILD_DIR_NAME / f"lib{args.package_dir.absolute().name}{STATIC_LIB_EXT}"
+    if args.output_file.suffix not in (STATIC_LIB_EXT, SHARED_LIB_EXT):
+        print(f"ERROR: The library must end with {STATIC_LIB_EXT} or {SHARED_LIB_EXT}, but was {args.output_file}")
+        exit(1)
+    if args.jobs < 1:
+        print(f"ERROR: --jobs must be positive, but was {args.jobs}")
+        exit(1)
+    args.output_file.parent.mkdir(parents=True, exist_ok=True)
+
+    options = OptionsCtx(use_cache=not args.no_cache, jobs=args.jobs, opt_level=args.opt_level,
+                         passes=parse_passes(args), parser=args.parser, time_passes=args.time_passes,
+                         mem_report=args.mem_report, profile=args.profile)
+    ok = run_library_compiler(args.package_dir, args.output_file, options)
+    if not ok:
+        exit(1)
+
+
+def add_output_arguments(argparser: ArgumentParser):
+    argparser.add_argument("--emit", default=EMIT_EXE,
+                           help="comma-separated outputs: exe (the linked program) and per-module artifacts "
+                                "of the optimized code written to the build directory: "
+                                f"{', '.join(EMIT_FILE_EXTS)}; defaults to exe")
+    argparser.add_argument("--lto", action="store_true",
+                           help="optimize every program as a whole, together with the runtime, before linking it")
+    argparser.add_argument("--library", action="append", type=Path, default=[], metavar="MANIFEST",
+                           help="link against a library built by herbc --lib instead of compiling its modules, "
+                                "can be repeated")
+
+
+def parse_libraries(args: Namespace) -> List[LibraryManifest]:
+    if len(args.library) > 0 and getattr(args, "lto", False):
+        print("ERROR: --lto cannot be used with prebuilt libraries")
+        exit(1)
+    libraries = []
+    for path in args.library:
+        try:
+            libraries.append(load_manifest(path))
+        except CompilationInterrupted as e:
+            print(f"ERROR: {e.message}")
+            exit(1)
+    return libraries
+
+
+def parse_emit(args: Namespace) -> List[str]:
+    emit = [kind.strip() for kind in args.emit.split(",") if kind.strip() != ""]
+    unknown_kinds = [kind for kind in emit if kind != EMIT_EXE and kind not in EMIT_FILE_EXTS]
+    if len(unknown_kinds) > 0:
+        print(f"ERROR: Unknown --emit kinds: {', '.join(unknown_kinds)}")
+        exit(1)
+    if len(emit) == 0:
+        print("ERROR: --emit must not be empty")
+        exit(1)
+    return emit
+
+
+def add_codegen_arguments(argparser: ArgumentParser):
+    argparser.add_argument("--parser", choices=PARSERS, default=PARSER_NATIVE,
+                           help="parser implementation, both build the same AST; defaults to native")
+    argparser.add_argument("-O", dest="opt_level", type=int, choices=[0, 1, 2, 3], default=0,
+                           help="optimization level")
+    argparser.add_argument("--passes", help="comma-separated LLVM passes to run instead of the -O pipeline, "
+                                            f"available: {', '.join(OPT_PASSES)}")
+    argparser.add_argument("--time-passes", action="store_true",
+                           help="report time, visited nodes and allocations of every normalization pass")
+    argparser.add_argument("--mem-report", action="store_true",
+                           help="report peak and retained memory of every phase and module, what allocated it, "
+                                "AST nodes by class and generated IR instructions")
+    argparser.add_argument("--profile", type=Path, metavar="PATH",
+                           help=f"profile the compiler, writes PATH{PSTATS_FILE_EXT} with the statistics "
+                                f"of cProfile and PATH{TRACE_FILE_EXT} with a timeline of the phases of every module "
+                                "for speedscope or chrome://tracing")
+
+
+def parse_passes(args: Namespace) -> List[str] | None:
+    if args.passes is None:
+        return None
+    passes = [p.strip() for p in args.passes.split(",") if p.strip() != ""]
+    unknown_passes = [p for p in passes if p not in OPT_PASSES]
+    if len(unknown_passes) > 0:
+        print(f"ERROR: Unknown passes: {', '.join(unknown_passes)}")
+        exit(1)
+    return passes
+
+
+def check_entry_file(herb_file: str) -> Path:
+    entry_file_path = Path(herb_file)
+    if not entry_file_path.is_file():
+        print(f"ERROR: {entry_file_path}: File not found")
+        exit(1)
+    return entry_file_path
+
+
+def create_compiler(root: Path, options: OptionsCtx | None) -> CompilationCtx:
+    options = options if options is not None else OptionsCtx()
+    return CompilationCtx(
         project=ProjectCtx(
-            root=filepath.parent,
+            root=root,
             root_packages={HERB_STD_PACKAGE_NAME: HERB_STD_PATH},
-            runtime=RT_PATH
+            runtime=RT_PATH,
+            build_dir_override=options.build_dir
         ),
         errors=ErrorCtx(),
-        outpath=outpath,
+        options=options,
+        profiler=Profiler() if options.profile is not None else None,
+        memory=MemoryReport() if options.mem_report else None,
     )
+
+
+def report_failure(compiler: CompilationCtx, e: CompilationInterrupted):
+    compiler.errors.print_errors()
+    if e.message != "":
+        print(f"\nERROR: {e.message}")
+    else:
+        print("Compilation failed!")
+
+
+def run_compiler(filepath: Path, outpath: Path, options: OptionsCtx | None = None) -> bool:
+    return run_batch_compiler([(filepath, outpath)], options)
+
+
+def run_batch_compiler(programs: List[Tuple[Path, Path]], options: OptionsCtx | None = None) -> bool:
+    """
+    Compiles several programs of the same project at once, the modules they share are loaded,
+    normalized and generated once.
+    :param programs: pairs of (entry file, output executable), all entry files must be in the project root directory
+    """
+    from src.gen.generate import generate
+
+    root = programs[0][0].parent
+    assert all(filepath.parent == root for filepath, _ in programs)
+    entries = [filepath for filepath, _ in programs]
+    entry_paths = set(filepath.absolute() for filepath in entries)
+
+    compiler = create_compiler(root, options)
+    loader = Loader(compiler, disk_ast_cache(compiler))
+    cache = BuildCache(compiler)
+    pm, timer = create_pass_manager(compiler)
+
+    compiler.project.build_dir().mkdir(parents=True, exist_ok=True)
+    try:
+        with compiler.phase("load"):
+            stale_files = cache.stale_files(entries)
+            loader.add_prebuilt_modules(cache.unchanged_modules())
+            loader.load_files(stale_files)
+            modules = loader.get_loaded_modules()
+        for mod in modules:
+            normalize(compiler, mod, is_entry=mod.path.absolute() in entry_paths, pm=pm)
+        generate(compiler, cache, programs, modules)
+        cache.save()
+    except CompilationInterrupted as e:
+        report_failure(compiler, e)
+        return False
+    finally:
+        report_stats(compiler, timer)
+    return True
+
+
+def run_checker(entries: List[Path], options: OptionsCtx | None = None) -> bool:
+    """
+    Loads and normalizes the programs without generating code,
+    neither the build directory nor the code generator are touched.
+    :param entries: entry files, all must be in the project root directory
+    """
+    root = entries[0].parent
+    assert all(filepath.parent == root for filepath in entries)
+    entry_paths = set(filepath.absolute() for filepath in entries)
+
+    compiler = create_compiler(root, options)
     loader = Loader(compiler)
+    pm, timer = create_pass_manager(compiler)
+    try:
+        with compiler.phase("load"):
+            loader.load_files(entries)
+            modules = loader.get_loaded_modules()
+        for mod in modules:
+            normalize(compiler, mod, is_entry=mod.path.absolute() in entry_paths, pm=pm)
+    except CompilationInterrupted as e:
+        report_failure(compiler, e)
+        return False
+    finally:
+        report_stats(compiler, timer)
+    return True
+
+
+def run_library_compiler(package_dir: Path, outpath: Path, options: OptionsCtx | None = None) -> bool:
+    """
+    Compiles all modules of the package, and the modules they import, into a library.
+    Unlike programs, every module is loaded, because the manifest is built from the declarations.
+    """
+    from src.gen.generate import generate_library
 
-    compiler.project.build_dir().mkdir(exist_ok=True)
+    compiler = create_compiler(package_dir, options)
+    loader = Loader(compiler, disk_ast_cache(compiler))
+    cache = BuildCache(compiler)
+    pm, timer = create_pass_manager(compiler)
+
+    compiler.project.build_dir().mkdir(parents=True, exist_ok=True)
     try:
-        entrymod = loader.load_file(filepath)
-        modules = loader.get_loaded_modules()
+        with compiler.phase("load"):
+            loader.load_files(sorted(package_dir.rglob("*" + HERB_FILE_EXT)))
+            modules = loader.get_loaded_modules()
         for mod in modules:
-            normalize(compiler, mod, is_entry=mod == entrymod)
-        generate(compiler, modules)
+            normalize(compiler, mod, pm=pm)
+        generate_library(compiler, cache, modules, outpath)
+        write_manifest(outpath, modules)
+        cache.save()
     except CompilationInterrupted as e:
-        compiler.errors.print_errors()
-        if e.message != "":
-            print(f"\nERROR: {e.message}")
-        else:
-            print("Compilation failed!")
+        report_failure(compiler, e)
+        return False
+    finally:
+        report_stats(compiler, timer)
+    return True
+
+
+def report_stats(compiler: CompilationCtx, timer: PassTimer | None):
+    if timer is not None:
+        print(timer.report())
+    if compiler.memory is not None:
+        compiler.memory.stop()
+        print(compiler.memory.report())
+    if compiler.profiler is not None:
+        files = compiler.profiler.save(compiler.options.profile)
+        print(f"Profile written to {', '.join(map(str, files))}")
+
+
+def create_pass_manager(compiler: CompilationCtx) -> Tuple[PassManager, PassTimer | None]:
+    pm = create_normalize_pass_manager()
+    if not compiler.options.time_passes:
+        return pm, None
+    timer = PassTimer()
+    timer.install(pm)
+    return pm, timer
+
+
+def load_program(compiler: CompilationCtx, filepath: Path, pm: PassManager | None = None) -> List[Module]:
+    """
+    Loads and normalizes all modules of the program, bypassing the build cache.
+    """
+    loader = Loader(compiler)
+    with compiler.phase("load"):
+        entrymod = loader.load_file(filepath)
+        modules = loader.get_loaded_modules()
+    for mod in modules:
+        normalize(compiler, mod, is_entry=mod == entrymod, pm=pm)
+    return modules
+
+
+def run_jit(filepath: Path, options: OptionsCtx | None = None) -> bool:
+    """
+    Compiles the program in memory and executes it in the compiler process.
+    :return: False if the program could not be compiled
+    """
+    program = compile_jit(filepath, options)
+    if program is None:
         return False
+    with program:
+        program.run()
     return True
 
 
+def compile_jit(filepath: Path, options: OptionsCtx | None = None) -> 'JitProgram | None':
+    """
+    :return: the program compiled in memory or None if it could not be compiled, the errors are printed.
+        The caller closes the program
+    """
+    from src.gen.jit import jit_compile
+
+    compiler = create_compiler(filepath.parent, options)
+    pm, timer = create_pass_manager(compiler)
+    try:
+        return jit_compile(compiler, filepath, load_program(compiler, filepath, pm))
+    except CompilationInterrupted as e:
+        report_failure(compiler, e)
+        return None
+    finally:
+        report_stats(compiler, timer)
+
+
 if __name__ == '__main__':
     main()
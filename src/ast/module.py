@@ -44,11 +44,18 @@ class Module(Node, Scope):
 
     @property
     def unique_name(self):
-        # TODO: there can be collisions
-        hashed = hashlib.md5(bytes(str(self.path.absolute()), encoding='utf-8')).hexdigest()
-        return hashed + "_" + self.name
+        return module_unique_name(self.path)
 
     def __str__(self):
         imp = "\n".join(str(i) for i in self.imports)
         decl = "\n".join([str(i) for i in self.top_level_decls])
         return f"// Module {self.path}\n{imp}{decl}"
+
+
+def module_unique_name(path: Path) -> str:
+    """
+    Prefix of the symbols of the module at the path, it is known without loading the module.
+    """
+    # TODO: there can be collisions
+    hashed = hashlib.md5(bytes(str(path.absolute()), encoding='utf-8')).hexdigest()
+    return hashed + "_" + path.stem
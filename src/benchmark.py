@@ -0,0 +1,108 @@
+import dataclasses
+import json
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+@dataclasses.dataclass
+class BenchResult:
+    mean: float  # seconds
+    median: float
+    stdev: float
+    runs: int
+
+    @staticmethod
+    def from_times(times: List[float]) -> 'BenchResult':
+        return BenchResult(
+            mean=statistics.mean(times),
+            median=statistics.median(times),
+            stdev=statistics.stdev(times) if len(times) > 1 else 0.0,
+            runs=len(times),
+        )
+
+
+# program -> configuration -> result
+BenchResults = Dict[str, Dict[str, BenchResult]]
+
+
+class BenchFailed(Exception):
+    def __init__(self, message: str):
+        self.message = message
+
+
+def run_benchmark(executable: Path, warmup: int, runs: int) -> Tuple[BenchResult, str]:
+    """
+    Runs the program warmup times without measuring it and then runs more times.
+    :return: wall time statistics and the output of the program
+    """
+    output = None
+    times = []
+    for i in range(warmup + runs):
+        start = time.perf_counter()
+        result = subprocess.run([], executable=executable, text=True, capture_output=True)
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            raise BenchFailed(f"{executable} exited with code {result.returncode}:\n{result.stderr}")
+        if output is not None and result.stdout != output:
+            raise BenchFailed(f"{executable} printed different outputs in different runs")
+        output = result.stdout
+        if i >= warmup:
+            times.append(elapsed)
+    return BenchResult.from_times(times), output
+
+
+def save_results(path: Path, results: BenchResults):
+    data = {program: {config: dataclasses.asdict(r) for config, r in configs.items()}
+            for program, configs in results.items()}
+    path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+
+
+def load_results(path: Path) -> BenchResults:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return {program: {config: BenchResult(**r) for config, r in configs.items()}
+                for program, configs in data.items()}
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        raise BenchFailed(f"Cannot read the baseline {path}: {e}")
+
+
+def format_results(results: BenchResults, baseline: BenchResults | None) -> str:
+    """
+    Every configuration is compared with the first one of the program, and with the baseline if there is one.
+    """
+    width = max([len("program"), *map(len, results)])
+    header = f"{'program':<{width}} {'config':<10} {'mean, ms':>10} {'median':>10} {'stddev':>8} {'speedup':>8}"
+    if baseline is not None:
+        header += f" {'vs base':>8}"
+    lines = [header]
+    for program, configs in results.items():
+        reference = next(iter(configs.values()))
+        for config, r in configs.items():
+            line = f"{program:<{width}} {config:<10} {r.mean * 1000:10.2f} {r.median * 1000:10.2f} " \
+                   f"{r.stdev * 1000:8.2f} {reference.mean / r.mean:7.2f}x"
+            if baseline is not None:
+                base = baseline.get(program, {}).get(config)
+                line += f" {100 * (r.mean - base.mean) / base.mean:+7.1f}%" if base is not None else f" {'-':>8}"
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def find_regressions(results: BenchResults, baseline: BenchResults, threshold: float) -> List[str]:
+    """
+    A configuration regressed if its mean got slower than the baseline by more than threshold
+    and by more than the noise of both measurements.
+    """
+    regressions = []
+    for program, configs in results.items():
+        for config, r in configs.items():
+            base = baseline.get(program, {}).get(config)
+            if base is None:
+                continue
+            diff = r.mean - base.mean
+            if diff > base.mean * threshold and diff > r.stdev + base.stdev:
+                regressions.append(f"{program} {config}: {base.mean * 1000:.2f} ms -> {r.mean * 1000:.2f} ms "
+                                   f"(+{100 * diff / base.mean:.0f}%)")
+    return regressions
@@ -0,0 +1,314 @@
+import contextlib
+import enum
+import gc
+import hashlib
+import importlib
+import marshal
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Union
+
+from src.ast import Module, Node
+from src.ast.base import next_node_id
+from src.ast.fixverify import set_parents
+from src.context.compilation_ctx import CompilationCtx
+from src.defs.constants import COMPILER_VERSION, AST_CACHE_DIR_NAME, AST_CACHE_MAX_BYTES
+from src.span import Span
+from src.ty import TyFunc, TyPrimitive, TySpecial, primitive_ty, special_ty
+
+# changes whenever the nodes or their encoding change, cached modules of other formats are not loaded
+AST_FORMAT_VERSION = 2
+AST_FILE_EXT = ".ast"
+
+# an encoded value is either None, a bool, an int, a str or a tuple starting with one of these tags
+NODE, ENUM, LIST, TUPLE, DICT, PATH, SPAN, TY_PRIMITIVE, TY_SPECIAL, TY_FUNC, REF = range(11)
+# the values nested this deep are encoded as chunks of their own and referred to by their index, so that neither
+# the encoder, marshal nor the decoder go deeper than this, however deep the AST is
+CHUNK_DEPTH = 256
+
+
+class AstEncoder:
+    """
+    Turns an AST into nested tuples of builtin values that marshal stores compactly and loads quickly.
+    A node is (NODE, class, span line, span column, fields...), the classes and the names of their fields
+    are stored once in a table. A value nested CHUNK_DEPTH levels deep is (REF, index in chunks).
+    """
+    classes: List[Tuple[str, str, Tuple[str, ...] | None]]  # (module, class name, field names)
+    chunks: List[object]  # deeply nested values, a chunk only refers to the ones after it
+    __class_ids: Dict[Tuple[type, Tuple[str, ...] | None], int]
+    __pending: List[Tuple[int, object]]  # chunks to encode: (index, value)
+
+    def __init__(self):
+        self.classes = []
+        self.chunks = []
+        self.__class_ids = dict()
+        self.__pending = []
+
+    def class_id(self, cls: type, names: Tuple[str, ...] | None) -> int:
+        key = (cls, names)
+        if key not in self.__class_ids:
+            self.__class_ids[key] = len(self.classes)
+            self.classes.append((cls.__module__, cls.__qualname__, names))
+        return self.__class_ids[key]
+
+    def encode(self, value) -> object:
+        """
+        The chunks found while a value is encoded are kept on an explicit stack and encoded afterwards.
+        """
+        root = self.__encode(value)
+        while len(self.__pending) > 0:
+            index, value = self.__pending.pop()
+            self.chunks[index] = self.__encode(value)
+        return root
+
+    def __encode(self, value, depth: int = 0) -> object:
+        if value is None or isinstance(value, (bool, int, str)) and not isinstance(value, enum.Enum):
+            return value
+        if depth == CHUNK_DEPTH:
+            self.__pending.append((len(self.chunks), value))
+            self.chunks.append(None)
+            return REF, len(self.chunks) - 1
+        depth += 1
+        if isinstance(value, Node):
+            fields = {name: v for name, v in vars(value).items() if name not in ("id", "parent", "span")}
+            cls = self.class_id(type(value), tuple(fields))
+            return (NODE, cls, value.span.line, value.span.column,
+                    *(self.__encode(v, depth) for v in fields.values()))
+        if isinstance(value, enum.Enum):
+            return ENUM, self.class_id(type(value), None), value.value
+        if isinstance(value, list):
+            return (LIST, *(self.__encode(v, depth) for v in value))
+        if isinstance(value, tuple):
+            return (TUPLE, *(self.__encode(v, depth) for v in value))
+        if isinstance(value, dict):
+            return (DICT, *(self.__encode(v, depth) for item in value.items() for v in item))
+        if isinstance(value, Path):
+            return PATH, str(value)
+        if isinstance(value, Span):
+            return SPAN, value.line, value.column
+        if isinstance(value, TyPrimitive):
+            return TY_PRIMITIVE, value.name
+        if isinstance(value, TySpecial) and special_ty(value.name) is value:
+            return TY_SPECIAL, value.name
+        if isinstance(value, TyFunc):
+            return TY_FUNC, self.__encode(value.args, depth), self.__encode(value.ret, depth)
+        raise TypeError(f"Cannot encode {type(value).__name__} in an AST")
+
+
+class AstDecoder:
+    """
+    Builds the nodes without calling their constructors, every node gets a fresh id.
+    """
+    classes: List[Tuple[type, Tuple[str, ...] | None]]
+    chunks: List[object]  # the decoded chunks
+
+    def __init__(self, classes: List[Tuple[str, str, Tuple[str, ...] | None]]):
+        self.classes = []
+        self.chunks = []
+        for module_name, class_name, names in classes:
+            # only the classes of the compiler can be instantiated
+            assert module_name.split(".")[0] == "src"
+            self.classes.append((getattr(importlib.import_module(module_name), class_name), names))
+
+    def decode_chunks(self, chunks: List[object]):
+        """
+        Decodes the chunks before the values that refer to them, the last one first.
+        """
+        self.chunks = [None] * len(chunks)
+        for index in reversed(range(len(chunks))):
+            self.chunks[index] = self.decode(chunks[index])
+
+    def decode(self, value) -> object:
+        if type(value) is not tuple:
+            return value
+        tag = value[0]
+        if tag == NODE:
+            cls, names = self.classes[value[1]]
+            node = cls.__new__(cls)
+            span = Span.__new__(Span)
+            span.line = value[2]
+            span.column = value[3]
+            fields = node.__dict__
+            fields["id"] = next_node_id()
+            fields["span"] = span
+            fields["parent"] = None
+            decode = self.decode
+            for name, v in zip(names, value[4:]):
+                fields[name] = decode(v) if type(v) is tuple else v
+            return node
+        if tag == LIST:
+            decode = self.decode
+            return [decode(v) if type(v) is tuple else v for v in value[1:]]
+        if tag == TY_PRIMITIVE:
+            return primitive_ty(value[1])
+        if tag == TY_SPECIAL:
+            return special_ty(value[1])
+        if tag == ENUM:
+            return self.classes[value[1]][0](value[2])
+        if tag == REF:
+            return self.chunks[value[1]]
+        if tag == TUPLE:
+            return tuple(self.decode(v) for v in value[1:])
+        if tag == TY_FUNC:
+            return TyFunc(args=self.decode(value[1]), ret=self.decode(value[2]))
+        if tag == DICT:
+            items = [self.decode(v) for v in value[1:]]
+            return dict(zip(items[::2], items[1::2]))
+        if tag == PATH:
+            return Path(value[1])
+        if tag == SPAN:
+            return Span(line=value[1], column=value[2])
+        raise ValueError(f"Unknown tag {tag} in an encoded AST")
+
+
+@contextlib.contextmanager
+def gc_paused() -> Iterator[None]:
+    """
+    The objects built while an AST is encoded or decoded all stay alive until it is done,
+    collecting garbage in the meantime only takes time, more of it the bigger the heap is.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def dump_module(mod: Module) -> bytes:
+    """
+    Serializes a freshly parsed module, before any import is resolved.
+    """
+    assert all(i.imported_module is None for i in mod.imports)
+    encoder = AstEncoder()
+    with gc_paused():
+        root = encoder.encode(mod)
+    data = marshal.dumps((AST_FORMAT_VERSION, encoder.classes, encoder.chunks, root))
+    return zlib.compress(data, 1)
+
+
+def load_module(data: bytes, path: Path) -> Module:
+    """
+    Every loaded module is a new copy with fresh node ids.
+    :param path: the path the module is loaded by, it may be spelled differently than the cached one
+    :raises ValueError: if the data is broken or has another format
+    """
+    with gc_paused():
+        try:
+            version, *content = marshal.loads(zlib.decompress(data))
+        except (zlib.error, EOFError, TypeError, ValueError) as e:
+            raise ValueError(f"Broken cached module: {e}")
+        if version != AST_FORMAT_VERSION:
+            raise ValueError(f"Cached module has format {version}, but {AST_FORMAT_VERSION} is expected")
+        classes, chunks, root = content
+        decoder = AstDecoder(classes)
+        decoder.decode_chunks(chunks)
+        mod: Module = decoder.decode(root)
+    mod.path = path
+    set_parents(mod)
+    return mod
+
+
+class MemoryAstCache:
+    """
+    Keeps parsed modules of unchanged files in memory, used by long-running compiler processes.
+    """
+    __modules: Dict[Path, Tuple[str, bytes]]  # path -> (source hash, serialized module)
+
+    def __init__(self):
+        self.__modules = dict()
+
+    def get(self, path: Path, source_hash: str) -> Union[bytes, None]:
+        entry = self.__modules.get(path.absolute())
+        if entry is None or entry[0] != source_hash:
+            return None
+        return entry[1]
+
+    def put(self, path: Path, source_hash: str, data: bytes):
+        self.__modules[path.absolute()] = (source_hash, data)
+
+
+class DiskAstCache:
+    """
+    Keeps parsed modules in the build directory, one file per module named by the hash of the source
+    and of the compiler version. When the files take more than max_bytes, the least recently used ones are deleted.
+    """
+    directory: Path
+    max_bytes: int
+    __sizes: Dict[Path, int] | None  # file -> size, the directory is listed when a module is stored the first time
+
+    def __init__(self, directory: Path, max_bytes: int = AST_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.__sizes = None
+
+    def get(self, source_hash: str) -> Union[bytes, None]:
+        path = self.__path(source_hash)
+        try:
+            data = path.read_bytes()
+            # the modification time orders the files by their last use
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, source_hash: str, data: bytes):
+        path = self.__path(source_hash)
+        sizes = self.__list()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # compilers can share the build directory, a file is either complete or missing
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        sizes[path] = len(data)
+        self.__evict()
+
+    def remove(self, source_hash: str):
+        self.__path(source_hash).unlink(missing_ok=True)
+
+    def __path(self, source_hash: str) -> Path:
+        key = hashlib.sha256(f"{COMPILER_VERSION};{AST_FORMAT_VERSION};{source_hash}".encode()).hexdigest()
+        return self.directory / (key + AST_FILE_EXT)
+
+    def __list(self) -> Dict[Path, int]:
+        if self.__sizes is None:
+            self.__sizes = dict()
+            if self.directory.is_dir():
+                for path in self.directory.glob("*" + AST_FILE_EXT):
+                    try:
+                        self.__sizes[path] = path.stat().st_size
+                    except OSError:
+                        pass
+        return self.__sizes
+
+    def __evict(self):
+        sizes = self.__list()
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+        used = dict()
+        for path in sizes:
+            try:
+                used[path] = path.stat().st_mtime
+            except OSError:
+                used[path] = 0
+        for path in sorted(used, key=used.get):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= sizes.pop(path)
+
+
+def disk_ast_cache(compiler: CompilationCtx) -> Union[DiskAstCache, None]:
+    """
+    :return: the cache in the build directory of the project, None if caching is disabled
+    """
+    if not compiler.options.use_cache:
+        return None
+    return DiskAstCache(compiler.project.build_dir() / AST_CACHE_DIR_NAME)
+
+
+# enabled by the compiler daemon
+memory_ast_cache: Union[MemoryAstCache, None] = None
@@ -0,0 +1,274 @@
+import dataclasses
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Union
+
+from src.ast import Module
+from src.context.compilation_ctx import CompilationCtx
+from src.defs.constants import BUILD_CACHE_FILE_NAME, COMPILER_VERSION
+
+
+# changes whenever the records or the objects of the modules change so that the builds recorded before
+# cannot be used, e.g. the objects cannot be linked with the new ones. Builds recorded with other formats are discarded
+OBJECT_FORMAT_VERSION = 3
+
+
+def file_hash(path: Path) -> Union[str, None]:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+@dataclasses.dataclass
+class ModuleRecord:
+    source_hash: str
+    is_entry: bool
+    codegen_key: str
+    imports: List[str]
+    key: str
+    artifact: str
+    emitted: Dict[str, str]  # --emit kind -> additional artifact
+    declarations: Dict[str, dict]  # what the importers of the module use, see LibraryModule
+
+
+class BuildCache:
+    """
+    Persistent record of the previous builds of a project, stored in the build directory.
+
+    A module is up to date when its source, the sources of all modules it imports (transitively)
+    and the compiler version did not change since it was built.
+    Up to date modules are neither parsed, normalized nor generated again: the modules that import them
+    are checked against their recorded declarations, like against the modules of a library.
+    Modules of prebuilt libraries are always up to date, their artifact is the library.
+    """
+    compiler: CompilationCtx
+    __modules: Dict[str, ModuleRecord]
+    __libraries: Dict[str, ModuleRecord]
+    __links: Dict[str, dict]
+    __hashes: Dict[Path, Union[str, None]]
+    __keys: Dict[Path, str]
+    __unchanged: Dict[Path, Dict[str, dict]]  # up to date modules found by stale_files -> their declarations
+
+    def __init__(self, compiler: CompilationCtx):
+        self.compiler = compiler
+        self.__modules = dict()
+        self.__links = dict()
+        self.__hashes = dict()
+        self.__keys = dict()
+        self.__unchanged = dict()
+        self.__libraries = dict()
+        for lib in compiler.options.libraries:
+            for m in lib.modules:
+                key = hashlib.sha256(f"{lib.key};{m.path}".encode("utf-8")).hexdigest()
+                self.__libraries[m.path] = ModuleRecord(
+                    source_hash="", is_entry=False, codegen_key="", imports=[], key=key,
+                    artifact=str(lib.library.absolute()), emitted=dict(), declarations=m.declarations
+                )
+                self.__keys[Path(m.path)] = key
+        if compiler.options.use_cache:
+            self.__load()
+
+    def path(self) -> Path:
+        return self.compiler.project.build_dir() / BUILD_CACHE_FILE_NAME
+
+    def __load(self):
+        try:
+            data = json.loads(self.path().read_text(encoding="utf-8"))
+            if data["version"] != COMPILER_VERSION or data.get("format") != OBJECT_FORMAT_VERSION:
+                return
+            self.__modules = {path: ModuleRecord(**record) for path, record in data["modules"].items()}
+            self.__links = data["links"]
+        except (OSError, ValueError, KeyError, TypeError):
+            # a missing or broken cache is the same as an empty one
+            self.__modules = dict()
+            self.__links = dict()
+
+    def save(self):
+        if not self.compiler.options.use_cache:
+            return
+        data = {
+            "version": COMPILER_VERSION,
+            "format": OBJECT_FORMAT_VERSION,
+            "modules": {path: dataclasses.asdict(record) for path, record in self.__modules.items()},
+            "links": self.__links,
+        }
+        path = self.path()
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def source_hash(self, path: Path) -> Union[str, None]:
+        path = path.absolute()
+        if path not in self.__hashes:
+            self.__hashes[path] = file_hash(path)
+        return self.__hashes[path]
+
+    # Modules
+
+    def __record(self, path: Path) -> Union[ModuleRecord, None]:
+        return self.__libraries.get(str(path)) or self.__modules.get(str(path))
+
+    def stale_files(self, entries: List[Path]) -> List[Path]:
+        """
+        Walks the import graph recorded by the previous builds starting from the entry files.
+        :return: files that must be loaded again: the changed ones and the ones that import them,
+            the other ones are available from unchanged_modules
+        """
+        given_entries = {entry.absolute(): entry for entry in entries}
+        order: List[Path] = []
+        visited = set()
+        importers: Dict[Path, List[Path]] = dict()
+        changed: List[Path] = []
+
+        stack = list(reversed(given_entries))
+        while len(stack) > 0:
+            path = stack.pop()
+            if path in visited:
+                continue
+            visited.add(path)
+            order.append(path)
+            if str(path) in self.__libraries:
+                continue
+            record = self.__modules.get(str(path))
+            if record is None:
+                changed.append(path)
+                continue
+            if record.source_hash != self.source_hash(path) \
+                    or record.is_entry != (path in given_entries) \
+                    or record.codegen_key != self.compiler.options.codegen_key() \
+                    or not self.__has_artifacts(record):
+                changed.append(path)
+            # the files a changed module imported before are likely still imported, they need not be loaded again
+            # when they are up to date. The other ones are loaded only when they are still imported, see below
+            for imp in record.imports:
+                importers.setdefault(Path(imp), []).append(path)
+                stack.append(Path(imp))
+
+        # files surely imported by the given entries: the imports of the changed modules are known once they are loaded
+        imported = set()
+        changed_files = set(changed)
+        stack = list(given_entries)
+        while len(stack) > 0:
+            path = stack.pop()
+            if path in imported:
+                continue
+            imported.add(path)
+            if path not in changed_files and str(path) in self.__modules:
+                stack.extend(Path(imp) for imp in self.__modules[str(path)].imports)
+
+        stale = set()
+        while len(changed) > 0:
+            path = changed.pop()
+            if path in stale:
+                continue
+            stale.add(path)
+            changed.extend(importers.get(path, []))
+
+        for path in order:
+            if path not in stale:
+                self.__keys[path] = self.__record(path).key
+                if str(path) not in self.__libraries:
+                    self.__unchanged[path] = self.__modules[str(path)].declarations
+        # entries are returned as they were given, so that diagnostics refer to them the same way
+        return [given_entries.get(path, path) for path in order if path in stale and path in imported]
+
+    def unchanged_modules(self) -> Dict[Path, Dict[str, dict]]:
+        """
+        :return: the modules that stale_files found up to date, without the library modules, -> their declarations
+        """
+        return self.__unchanged
+
+    def module_key(self, mod: Module) -> str:
+        """
+        Must be called for the imported modules first.
+        """
+        h = hashlib.sha256()
+        h.update(COMPILER_VERSION.encode("utf-8"))
+        h.update(self.compiler.options.codegen_key().encode("utf-8"))
+        h.update(self.source_hash(mod.path).encode("utf-8"))
+        h.update(b"entry" if mod.entry is not None else b"lib")
+        for imp in sorted(str(i.resolved_path().absolute()) for i in mod.imports):
+            h.update(self.__keys[Path(imp)].encode("utf-8"))
+        return h.hexdigest()
+
+    def is_up_to_date(self, mod: Module, key: str) -> bool:
+        record = self.__modules.get(str(mod.path.absolute()))
+        return record is not None and record.key == key and self.__has_artifacts(record)
+
+    def __has_artifacts(self, record: ModuleRecord) -> bool:
+        """
+        Checks that the object file and the artifacts requested by --emit were produced and were not deleted since.
+        """
+        if not Path(record.artifact).is_file():
+            return False
+        return all(kind in record.emitted and Path(record.emitted[kind]).is_file()
+                   for kind in self.compiler.options.module_emit_kinds())
+
+    def record_module(self, mod: Module, key: str, artifact: Path, emitted: Dict[str, Path],
+                      declarations: Dict[str, dict]):
+        """
+        :param declarations: declarations of the normalized module, see LibraryModule
+        """
+        path = mod.path.absolute()
+        self.__keys[path] = key
+        self.__modules[str(path)] = ModuleRecord(
+            source_hash=self.source_hash(path),
+            is_entry=mod.entry is not None,
+            codegen_key=self.compiler.options.codegen_key(),
+            imports=sorted(str(i.resolved_path().absolute()) for i in mod.imports),
+            key=key,
+            artifact=str(artifact.absolute()),
+            emitted={kind: str(path.absolute()) for kind, path in emitted.items()},
+            declarations=declarations,
+        )
+
+    def program_modules(self, entry: Path) -> List[ModuleRecord]:
+        """
+        :return: records of all modules of the program, every module must be recorded by now
+        """
+        result = dict()
+        stack = [str(entry.absolute())]
+        while len(stack) > 0:
+            path = stack.pop()
+            if path in result:
+                continue
+            result[path] = self.__record(Path(path))
+            stack.extend(result[path].imports)
+        return list(result.values())
+
+    # Linking
+
+    def link_key(self, entry: Path, inputs: List[Path]) -> str:
+        """
+        :param inputs: additional files that are linked into the program, e.g. the runtime
+        """
+        h = hashlib.sha256()
+        h.update(COMPILER_VERSION.encode("utf-8"))
+        h.update(self.compiler.options.codegen_key().encode("utf-8"))
+        for key in sorted(record.key for record in self.program_modules(entry)):
+            h.update(key.encode("utf-8"))
+        for path in sorted(inputs):
+            h.update(str(path).encode("utf-8"))
+            h.update((self.source_hash(path) or "").encode("utf-8"))
+        return h.hexdigest()
+
+    def library_key(self, modules: List[Module]) -> str:
+        """
+        :param modules: modules packed into the library, must be recorded by now
+        """
+        h = hashlib.sha256()
+        h.update(COMPILER_VERSION.encode("utf-8"))
+        for key in sorted(self.__keys[m.path.absolute()] for m in modules):
+            h.update(key.encode("utf-8"))
+        return h.hexdigest()
+
+    def is_link_up_to_date(self, outpath: Path, key: str) -> bool:
+        record = self.__links.get(str(outpath.absolute()))
+        return record is not None and record["key"] == key \
+            and outpath.is_file() and outpath.stat().st_mtime_ns == record["mtime"]
+
+    def record_link(self, outpath: Path, key: str):
+        self.__links[str(outpath.absolute())] = {"key": key, "mtime": outpath.stat().st_mtime_ns}
@@ -1,17 +1,23 @@
+import contextlib
 import dataclasses
-from pathlib import Path
+from typing import Iterator
 
 from src.ast import Node
 from src.ast.utils import module
+from src.context.options_ctx import OptionsCtx
 from src.context.project_ctx import ProjectCtx
 from src.context.error_ctx import ErrorCtx, CompilationError
+from src.memory_report import MemoryReport
+from src.profiler import Profiler, COMPILER_LANE
 
 
 @dataclasses.dataclass
 class CompilationCtx:
     project: ProjectCtx
     errors: ErrorCtx
-    outpath: Path
+    options: OptionsCtx = dataclasses.field(default_factory=OptionsCtx)
+    profiler: Profiler | None = None
+    memory: MemoryReport | None = None
 
     def add_error_to_node(self, node: Node, message: str, hint=""):
         self.errors.add_error(CompilationError(span=node.span, message=message, hint=hint, filepath=module(node).path))
@@ -21,3 +27,13 @@ class CompilationCtx:
 
     def has_errors(self) -> bool:
         return self.errors.has_errors()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, lane: str = COMPILER_LANE) -> Iterator[None]:
+        """
+        Profiles the phase and measures its memory if the compilation is profiled or measured.
+        :param lane: the module the phase works on, or COMPILER_LANE
+        """
+        with self.memory.phase(name, lane) if self.memory is not None else contextlib.nullcontext(), \
+                self.profiler.phase(name, lane) if self.profiler is not None else contextlib.nullcontext():
+            yield
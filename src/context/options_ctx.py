@@ -0,0 +1,41 @@
+import dataclasses
+import os
+from pathlib import Path
+from typing import List, TYPE_CHECKING
+
+from src.defs.constants import EMIT_EXE, EMIT_FILE_EXTS, OBJ_FILE_EXT, PARSER_NATIVE
+
+if TYPE_CHECKING:
+    from src.library.manifest import LibraryManifest
+
+
+@dataclasses.dataclass
+class OptionsCtx:
+    use_cache: bool = True
+    parser: str = PARSER_NATIVE  # see PARSERS
+    jobs: int = os.cpu_count() or 1
+    opt_level: int = 0
+    passes: List[str] | None = None  # explicit optimization pipeline, overrides the one of opt_level
+    time_passes: bool = False
+    mem_report: bool = False
+    profile: Path | None = None  # path of the profile files without the extensions, see Profiler.save
+    lto: bool = False  # the whole program is optimized as one LLVM module
+    libraries: List['LibraryManifest'] = dataclasses.field(default_factory=list)  # prebuilt modules to link against
+    build_dir: Path | None = None  # overrides the build directory of the project
+    emit: List[str] = dataclasses.field(default_factory=lambda: [EMIT_EXE])  # kinds of outputs, see EMIT_FILE_EXTS
+
+    def links_executable(self) -> bool:
+        return EMIT_EXE in self.emit
+
+    def module_emit_kinds(self) -> List[str]:
+        """
+        Per-module artifacts requested in addition to the object file, which is always produced.
+        """
+        return [kind for kind in self.emit if kind in EMIT_FILE_EXTS and EMIT_FILE_EXTS[kind] != OBJ_FILE_EXT]
+
+    def codegen_key(self) -> str:
+        """
+        Identifies the options that change the generated code.
+        """
+        passes = ",".join(self.passes) if self.passes is not None else ""
+        return f"O{self.opt_level};{passes}" + (";lto" if self.lto else "")
@@ -10,6 +10,9 @@ class ProjectCtx:
     root: Path
     runtime: Path
     root_packages: Dict[str, Path]
+    build_dir_override: Path | None = None  # by default the build directory is in the project root
 
     def build_dir(self):
+        if self.build_dir_override is not None:
+            return self.build_dir_override
         return self.root / BUILD_DIR_NAME
@@ -0,0 +1,52 @@
+"""
+Thin client of the compiler daemon: python herbc_client.py <herbc arguments>
+
+Only the standard library is imported, so the client starts quickly.
+If the daemon is not running the compiler is run in this process.
+"""
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import List
+
+from src.daemon.protocol import default_socket_path, check_socket_dir, send_message, receive_message
+
+
+def main(argv: List[str]) -> int:
+    socket_path = default_socket_path()
+    sock = None
+    if os.path.exists(socket_path):
+        error = check_socket_dir(socket_path)
+        if error is None:
+            sock = connect(socket_path)
+        else:
+            print(f"WARNING: not using the compiler daemon at {socket_path}: {error}", file=sys.stderr)
+    if sock is None:
+        import main as herbc
+        herbc.main(argv)
+        return 0
+
+    with sock, sock.makefile("rwb") as f:
+        send_message(f, {"argv": argv, "cwd": os.getcwd()})
+        while (message := receive_message(f)) is not None:
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "exit" in message:
+                return message["exit"]
+    print("ERROR: the compiler daemon closed the connection", file=sys.stderr)
+    return 1
+
+
+def connect(socket_path: Path) -> socket.socket | None:
+    """
+    :return: None if no daemon is listening on the socket
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
@@ -0,0 +1,56 @@
+"""
+The compiler daemon and its clients exchange JSON messages, one per line.
+
+client -> daemon: {"argv": [...], "cwd": "..."}
+daemon -> client: {"out": "..."} any number of times, then {"exit": <exit code>}
+"""
+import json
+import os
+import stat
+import tempfile
+from pathlib import Path
+from typing import BinaryIO
+
+from src.defs.constants import DAEMON_SOCKET_ENV, DAEMON_SOCKET_NAME
+
+
+def default_socket_path() -> Path:
+    """
+    $HERBC_SOCKET, otherwise a socket in $XDG_RUNTIME_DIR or in a per-user directory in the temp directory
+    """
+    if DAEMON_SOCKET_ENV in os.environ:
+        return Path(os.environ[DAEMON_SOCKET_ENV])
+    if os.environ.get("XDG_RUNTIME_DIR", "") != "":
+        return Path(os.environ["XDG_RUNTIME_DIR"]) / DAEMON_SOCKET_NAME
+    return Path(tempfile.gettempdir()) / f"herbc-{os.getuid()}" / DAEMON_SOCKET_NAME
+
+
+def check_socket_dir(socket_path: Path) -> str | None:
+    """
+    Only the user may be able to create the socket, otherwise anyone could put a fake daemon in its place.
+    :return: why the directory of the socket cannot be trusted, None if it can be
+    """
+    directory = socket_path.parent
+    try:
+        st = os.lstat(directory)
+    except OSError as e:
+        return f"cannot access {directory}: {e.strerror}"
+    if not stat.S_ISDIR(st.st_mode):
+        return f"{directory} is not a directory"
+    if st.st_uid != os.getuid():
+        return f"{directory} belongs to another user"
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH) != 0:
+        return f"{directory} is writable by other users"
+    return None
+
+
+def send_message(f: BinaryIO, message: dict):
+    f.write(json.dumps(message).encode("utf-8") + b"\n")
+    f.flush()
+
+
+def receive_message(f: BinaryIO) -> dict | None:
+    line = f.readline()
+    if line == b"":
+        return None
+    return json.loads(line)
@@ -0,0 +1,100 @@
+import io
+import os
+import signal
+import socket
+import socketserver
+import stat
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+from pathlib import Path
+from typing import BinaryIO, Callable, List
+
+from src.cache import ast_cache
+from src.daemon.protocol import send_message, receive_message, check_socket_dir
+
+
+class StreamingWriter(io.TextIOBase):
+    """
+    Forwards everything the compiler prints to the client as soon as it is printed.
+    """
+    def __init__(self, f: BinaryIO):
+        self.f = f
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        if s != "":
+            send_message(self.f, {"out": s})
+        return len(s)
+
+
+class DaemonFailed(Exception):
+    def __init__(self, message: str):
+        self.message = message
+
+
+def prepare_socket_path(socket_path: Path):
+    """
+    Creates the private directory of the socket and removes the socket of a daemon that is no longer running.
+    :raises DaemonFailed: if the directory is not private or another daemon is listening on the socket
+    """
+    try:
+        socket_path.parent.mkdir(mode=0o700, exist_ok=True)
+    except OSError as e:
+        raise DaemonFailed(f"cannot create the directory of the socket {socket_path}: {e.strerror}")
+    error = check_socket_dir(socket_path)
+    if error is not None:
+        raise DaemonFailed(f"refusing to listen on {socket_path}: {error}")
+    if not os.path.lexists(socket_path):
+        return
+    if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+        raise DaemonFailed(f"{socket_path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            socket_path.unlink()
+            return
+    raise DaemonFailed(f"another herbc daemon is already listening on {socket_path}")
+
+
+def serve(socket_path: Path, run: Callable[[List[str]], None]):
+    """
+    Serves compilation requests until interrupted. Requests are handled one at a time:
+    each of them changes the working directory and redirects the standard output of the process.
+    Imports, ANTLR parser caches, LLVM and parsed modules of unchanged files stay warm between requests.
+    :param run: compiler entry point, receives the command line arguments
+    :raises DaemonFailed: if the socket cannot be used
+    """
+    prepare_socket_path(socket_path)
+    ast_cache.memory_ast_cache = ast_cache.MemoryAstCache()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = receive_message(self.rfile)
+            if request is None:
+                return
+            out = StreamingWriter(self.wfile)
+            code = 0
+            with redirect_stdout(out), redirect_stderr(out):
+                try:
+                    os.chdir(request["cwd"])
+                    run(request["argv"])
+                except SystemExit as e:
+                    code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                except Exception:
+                    traceback.print_exc()
+                    code = 1
+            send_message(self.wfile, {"exit": code})
+
+    # stop on 'kill' the same way as on Ctrl+C, so that the socket is removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    with socketserver.UnixStreamServer(str(socket_path), Handler) as server:
+        print(f"herbc daemon is listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket_path.unlink(missing_ok=True)
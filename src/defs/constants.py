@@ -1,9 +1,36 @@
 
 HERB_FILE_EXT = ".herb"
 LL_FILE_EXT = ".ll"
+OBJ_FILE_EXT = ".o"
+BC_FILE_EXT = ".bc"
+ASM_FILE_EXT = ".s"
+C_FILE_EXT = ".c"
+STATIC_LIB_EXT = ".a"
+SHARED_LIB_EXT = ".so"
+
+# --emit kind -> extension of the per-module artifact, "exe" is the linked program
+EMIT_EXE = "exe"
+EMIT_FILE_EXTS = {"ll": LL_FILE_EXT, "bc": BC_FILE_EXT, "obj": OBJ_FILE_EXT, "asm": ASM_FILE_EXT}
+
+# implementations of the parser, they build the same AST
+PARSER_NATIVE = "native"
+PARSER_ANTLR = "antlr"
+PARSERS = [PARSER_NATIVE, PARSER_ANTLR]
 
 RUNTIME_DIR_NAME = "runtime"
 BUILD_DIR_NAME = "build"
 
 HERB_STD_PACKAGE_NAME = "herb"
 HERB_STD_DIR_NAME = "herb"
+
+# the parsers build expressions without recursion, but the passes over the AST recurse once per level of nesting.
+# Python calls do not use the C stack, a deep AST only costs the memory of the frames
+RECURSION_LIMIT = 1000000
+
+COMPILER_VERSION = "0.1.0"
+BUILD_CACHE_FILE_NAME = "build_cache.json"
+AST_CACHE_DIR_NAME = "ast_cache"
+AST_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+DAEMON_SOCKET_ENV = "HERBC_SOCKET"
+DAEMON_SOCKET_NAME = "herbc.sock"
@@ -0,0 +1,33 @@
+# pass name -> llvm.PassManager method that adds it
+OPT_PASSES = {
+    "sroa": "add_sroa_pass",
+    # llvmlite does not expose mem2reg, SROA promotes allocas to registers as well
+    "mem2reg": "add_sroa_pass",
+    "instcombine": "add_instruction_combining_pass",
+    "simplifycfg": "add_cfg_simplification_pass",
+    "reassociate": "add_reassociate_expressions_pass",
+    "gvn": "add_gvn_pass",
+    "sccp": "add_sccp_pass",
+    "ipsccp": "add_ipsccp_pass",
+    "dce": "add_dead_code_elimination_pass",
+    "adce": "add_aggressive_dead_code_elimination_pass",
+    "dse": "add_dead_store_elimination_pass",
+    "jump-threading": "add_jump_threading_pass",
+    "tailcallelim": "add_tail_call_elimination_pass",
+    "inline": "add_function_inlining_pass",
+    "always-inline": "add_always_inliner_pass",
+    "functionattrs": "add_function_attrs_pass",
+    "globalopt": "add_global_optimizer_pass",
+    "globaldce": "add_global_dce_pass",
+    "constmerge": "add_constant_merge_pass",
+    "deadargelim": "add_dead_arg_elimination_pass",
+    "licm": "add_licm_pass",
+    "loop-simplify": "add_loop_simplification_pass",
+    "loop-rotate": "add_loop_rotate_pass",
+    "loop-unroll": "add_loop_unroll_pass",
+    "loop-unswitch": "add_loop_unswitch_pass",
+    "loop-deletion": "add_loop_deletion_pass",
+    "lcssa": "add_lcssa_pass",
+    "basic-aa": "add_basic_alias_analysis_pass",
+    "tbaa": "add_type_based_alias_analysis_pass",
+}
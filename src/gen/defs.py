@@ -1,6 +1,8 @@
+from pathlib import Path
+
 from llvmlite import ir
 
-from src.ast import Decl, FunDecl
+from src.ast import Decl, FunDecl, module_unique_name
 from src.ast.utils import module
 from src.ty import Ty, TyInt, TyBool, TyStr, TyFunc, TyVoid
 
@@ -17,7 +19,8 @@ str_type = byteptr
 # functions
 main_fn_type = ir.FunctionType(void_type, [])
 USER_MAIN_FN_NAME = "main"
-OUT_MAIN_FN_NAME = "__HERB__entry"
+OUT_MAIN_FN_NAME = "__HERB__entry"  # defined by the start module of every program, calls the entrypoint
+RUNTIME_MAIN_FN_NAME = "main"  # defined by the runtime, calls OUT_MAIN_FN_NAME
 
 print_int_fn_type = ir.FunctionType(void_type, [int_type])
 PRINT_INT_FN_NAME = "print_int"
@@ -33,6 +36,14 @@ def func_name(fn: FunDecl):
     return f"{module(fn).unique_name}.func.{fn.name}"
 
 
+def entry_fn_name(entry_file: Path):
+    """
+    Every module with an entrypoint defines its own function, a module can be the entry of one program
+    and be imported by another one.
+    """
+    return f"{module_unique_name(entry_file)}.entry"
+
+
 def global_name(decl: Decl):
     return f"{module(decl).unique_name}.{decl.declared_name()}"
 
@@ -0,0 +1,137 @@
+from pathlib import Path
+from typing import Dict, List
+
+from llvmlite import binding as llvm
+
+from src.defs.passes import OPT_PASSES
+from src.gen.defs import LL_TRIPLE, RUNTIME_MAIN_FN_NAME
+
+# -O level -> inlining threshold, the same values clang uses
+INLINING_THRESHOLDS = {1: 0, 2: 225, 3: 275}
+
+__target_machines: Dict[int, llvm.TargetMachine] = dict()
+__initialized = False
+
+
+def target_machine(opt_level: int = 0, jit: bool = False) -> llvm.TargetMachine:
+    """
+    LLVM is initialized lazily and once per process.
+    :param jit: machine code is executed in-process instead of being written to an object file.
+        The execution engine takes ownership of the machine, so such machines are not shared
+    """
+    global __initialized
+    if not __initialized:
+        llvm.initialize()
+        llvm.initialize_native_target()
+        llvm.initialize_native_asmprinter()
+        __initialized = True
+    target = llvm.Target.from_triple(LL_TRIPLE)
+    if jit:
+        return target.create_target_machine(opt=opt_level, codemodel="jitdefault")
+    if opt_level not in __target_machines:
+        __target_machines[opt_level] = target.create_target_machine(opt=opt_level, reloc="pic", codemodel="small")
+    return __target_machines[opt_level]
+
+
+def parse_ir(ir_text: str) -> llvm.ModuleRef:
+    tm = target_machine()
+    ll_module = llvm.parse_assembly(ir_text)
+    ll_module.verify()
+    ll_module.triple = tm.triple
+    return ll_module
+
+
+def optimize(ll_module: llvm.ModuleRef, opt_level: int, passes: List[str] | None = None):
+    """
+    Runs either the explicit pipeline of passes or the standard pipeline of the given -O level.
+    """
+    pm = llvm.create_module_pass_manager()
+    target_machine(opt_level).add_analysis_passes(pm)
+    if passes is not None:
+        for name in passes:
+            add_pass = getattr(pm, OPT_PASSES[name])
+            if name == "inline":
+                add_pass(INLINING_THRESHOLDS[max(opt_level, 2)])
+            else:
+                add_pass()
+    elif opt_level > 0:
+        pmb = llvm.create_pass_manager_builder()
+        pmb.opt_level = opt_level
+        pmb.inlining_threshold = INLINING_THRESHOLDS[opt_level]
+        pmb.loop_vectorize = opt_level >= 2
+        pmb.slp_vectorize = opt_level >= 2
+        fpm = llvm.create_function_pass_manager(ll_module)
+        pmb.populate(fpm)
+        pmb.populate(pm)
+        fpm.initialize()
+        for fn in ll_module.functions:
+            fpm.run(fn)
+        fpm.finalize()
+    else:
+        return
+    pm.run(ll_module)
+
+
+def emit_module(ir_text: str, outputs: Dict[str, Path], opt_level: int = 0, passes: List[str] | None = None) \
+        -> str | None:
+    """
+    Compiles a module in-process and writes the requested artifacts of the optimized module,
+    runs in a worker process.
+    :param outputs: --emit kind -> output file, see EMIT_FILE_EXTS
+    :return: error message or None
+    """
+    try:
+        ll_module = parse_ir(ir_text)
+    except RuntimeError as e:
+        return f"LLVM rejected the generated module {next(iter(outputs.values())).stem}:\n{e}"
+    optimize(ll_module, opt_level, passes)
+    write_artifacts(ll_module, outputs, opt_level)
+    return None
+
+
+def write_artifacts(ll_module: llvm.ModuleRef, outputs: Dict[str, Path], opt_level: int):
+    """
+    :param outputs: --emit kind -> output file, see EMIT_FILE_EXTS
+    """
+    tm = target_machine(opt_level)
+    for kind, path in outputs.items():
+        if kind == "ll":
+            path.write_text(str(ll_module), encoding="utf-8")
+        elif kind == "bc":
+            path.write_bytes(ll_module.as_bitcode())
+        elif kind == "asm":
+            path.write_text(tm.emit_assembly(ll_module), encoding="utf-8")
+        else:
+            path.write_bytes(tm.emit_object(ll_module))
+
+
+def emit_lto_object(bc_files: List[Path], obj_file: Path, opt_level: int = 0, passes: List[str] | None = None) \
+        -> str | None:
+    """
+    Merges the bitcode of the whole program, including the runtime, into one module and optimizes it at once,
+    so that calls across modules can be inlined. Runs in a worker process.
+    :return: error message or None
+    """
+    tm = target_machine(opt_level)
+    try:
+        ll_module = llvm.parse_bitcode(bc_files[0].read_bytes())
+        for path in bc_files[1:]:
+            ll_module.link_in(llvm.parse_bitcode(path.read_bytes()))
+    except RuntimeError as e:
+        return f"LLVM could not link the program {obj_file.stem}:\n{e}"
+    ll_module.triple = tm.triple
+    ll_module.data_layout = str(tm.target_data)
+    internalize(ll_module)
+    optimize(ll_module, opt_level, passes)
+    obj_file.write_bytes(tm.emit_object(ll_module))
+    return None
+
+
+def internalize(ll_module: llvm.ModuleRef):
+    """
+    The merged module is the whole program: everything but the C entry point can be internal,
+    which lets the optimizer inline, specialize and drop the definitions.
+    """
+    for value in [*ll_module.functions, *ll_module.global_variables]:
+        if not value.is_declaration and value.name != RUNTIME_MAIN_FN_NAME:
+            value.linkage = llvm.Linkage.internal
@@ -98,7 +98,7 @@ class GenVisitor(AstVisitor):
         self.f = ir.Function(
             module=self.module,
             ftype=main_fn_type,
-            name=OUT_MAIN_FN_NAME
+            name=entry_fn_name(self.module_node.path)
         )
         self.builder = ir.IRBuilder(self.f.append_basic_block(name="entry"))
         self.visit(n.block, None)
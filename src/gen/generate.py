@@ -1,27 +1,129 @@
 import dataclasses
 import subprocess
 from pathlib import Path
-from typing import List
+from typing import List, Tuple
 from llvmlite import ir
 
-from src.ast import Module, AstVisitor
-from src.defs.constants import LL_FILE_EXT
+from src.ast import Module, AstVisitor, module_unique_name
+from src.cache.build_cache import BuildCache
+from src.defs.constants import OBJ_FILE_EXT, EMIT_FILE_EXTS, BC_FILE_EXT, STATIC_LIB_EXT, SHARED_LIB_EXT
 from src.context.compilation_ctx import CompilationCtx
+from src.gen.defs import LL_TRIPLE, OUT_MAIN_FN_NAME, main_fn_type, entry_fn_name
 from src.gen.gen_visitor import GenVisitor
-from src.gen.make_executable import make_executable
+from src.gen.make_executable import make_executables, compile_objects, get_runtime_obj_files, make_library
+from src.library.manifest import module_declarations
 
 
-def generate(ctx: CompilationCtx, modules: List[Module]):
-    ll_files = []
+def generate(ctx: CompilationCtx, cache: BuildCache, programs: List[Tuple[Path, Path]], modules: List[Module]):
+    """
+    Generates the modules that are not up to date, compiles them to object files in parallel and links the programs.
+    Modules shared by several programs are generated and compiled once.
+    With link-time optimization the modules are compiled to bitcode instead,
+    and every program is merged with the runtime and optimized as a whole before it is linked.
+    :param programs: pairs of (entry file, output executable)
+    :param modules: loaded modules, the rest of the programs is taken from the cache
+    """
+    lto = ctx.options.lto
+    compile_modules(ctx, cache, modules)
+
+    if not ctx.options.links_executable():
+        return
+    runtime_files = get_runtime_obj_files(ctx, bitcode=lto)
+    artifact_kind, artifact_ext = module_artifact_kind(ctx)
+    links = []
+    start_jobs = []
+    for entry, outpath in programs:
+        link_key = cache.link_key(entry, runtime_files)
+        if not cache.is_link_up_to_date(outpath, link_key):
+            start_file = ctx.project.build_dir() / (outpath.name + ".start" + artifact_ext)
+            start_jobs.append((str(generate_start_module(entry)), {artifact_kind: start_file}))
+            artifacts = dict.fromkeys(Path(record.artifact) for record in cache.program_modules(entry))
+            # libraries are searched for the symbols that the objects before them are missing
+            inputs = runtime_files + [start_file] + \
+                sorted(artifacts, key=lambda p: p.suffix in (STATIC_LIB_EXT, SHARED_LIB_EXT))
+            links.append((inputs, outpath, link_key))
+    if len(links) == 0:
+        return
+    with ctx.phase("compile objects"):
+        compile_objects(ctx, start_jobs)
+    if lto:
+        lto_jobs = [(inputs, ctx.project.build_dir() / (outpath.name + ".lto" + OBJ_FILE_EXT))
+                    for inputs, outpath, _ in links]
+        with ctx.phase("lto"):
+            compile_objects(ctx, [], lto_jobs=lto_jobs)
+        with ctx.phase("link"):
+            make_executables(ctx, [([obj_file], outpath)
+                                   for (_, obj_file), (_, outpath, _) in zip(lto_jobs, links)])
+    else:
+        with ctx.phase("link"):
+            make_executables(ctx, [(inputs, outpath) for inputs, outpath, _ in links])
+    for _, outpath, link_key in links:
+        cache.record_link(outpath, link_key)
+
+
+def generate_library(ctx: CompilationCtx, cache: BuildCache, modules: List[Module], outpath: Path):
+    """
+    Compiles the modules and packs them into a static library or, if outpath ends with SHARED_LIB_EXT,
+    a shared one. The runtime is not included, it is linked into the programs.
+    :param modules: all modules of the library
+    """
+    compile_modules(ctx, cache, modules)
+    obj_files = [module_artifact_path(ctx, m, OBJ_FILE_EXT) for m in modules]
+    key = cache.library_key(modules)
+    if cache.is_link_up_to_date(outpath, key):
+        return
+    with ctx.phase("archive"):
+        make_library(obj_files, outpath)
+    cache.record_link(outpath, key)
+
+
+def compile_modules(ctx: CompilationCtx, cache: BuildCache, modules: List[Module]):
+    """
+    Generates the modules that are not up to date and compiles them in parallel.
+    """
+    artifact_kind, artifact_ext = module_artifact_kind(ctx)
+    ir_jobs = []
     for m in modules:
-        ll_file = generate_module(ctx, m)
-        ll_files.append(ll_file)
-    make_executable(ctx, ll_files)
+        key = cache.module_key(m)
+        artifact = module_artifact_path(ctx, m, artifact_ext)
+        emitted = {kind: module_artifact_path(ctx, m, EMIT_FILE_EXTS[kind]) for kind in ctx.options.module_emit_kinds()}
+        if not cache.is_up_to_date(m, key):
+            with ctx.phase("generate", str(m.path)):
+                ir_jobs.append((str(generate_module(ctx, m)), {artifact_kind: artifact, **emitted}))
+        cache.record_module(m, key, artifact, emitted, module_declarations(m))
+    # with several jobs the objects are compiled by worker processes, the profile only shows how long they took
+    with ctx.phase("compile objects"):
+        compile_objects(ctx, ir_jobs)
+
+
+def module_artifact_kind(ctx: CompilationCtx) -> Tuple[str, str]:
+    """
+    :return: --emit kind and extension of the files that are linked into the programs
+    """
+    return ("bc", BC_FILE_EXT) if ctx.options.lto else ("obj", OBJ_FILE_EXT)
+
+
+def module_artifact_path(ctx: CompilationCtx, mod: Module, ext: str) -> Path:
+    return ctx.project.build_dir() / (mod.unique_name + ext)
+
+
+def generate_module(ctx: CompilationCtx, mod: Module) -> ir.Module:
+    ir_module = GenVisitor(ctx, mod).generate()
+    if ctx.memory is not None:
+        ctx.memory.count_instructions(mod, ir_module)
+    return ir_module
 
 
-def generate_module(ctx: CompilationCtx, mod: Module) -> Path:
-    ll_module = GenVisitor(ctx, mod).generate()
-    ll_outpath = ctx.project.build_dir() / (mod.unique_name + LL_FILE_EXT)
-    with open(str(ll_outpath), "w") as f:
-        f.write(str(ll_module))
-    return ll_outpath
+def generate_start_module(entry: Path) -> ir.Module:
+    """
+    The runtime calls OUT_MAIN_FN_NAME, which is defined here for every program, outside the module objects:
+    a module can be the entry of one program and be imported by another one.
+    """
+    ir_module = ir.Module(name=module_unique_name(entry) + ".start")
+    ir_module.triple = LL_TRIPLE
+    entry_fn = ir.Function(ir_module, main_fn_type, name=entry_fn_name(entry))
+    start_fn = ir.Function(ir_module, main_fn_type, name=OUT_MAIN_FN_NAME)
+    builder = ir.IRBuilder(start_fn.append_basic_block(name="entry"))
+    builder.call(entry_fn, [])
+    builder.ret_void()
+    return ir_module
@@ -0,0 +1,98 @@
+import ctypes
+import sys
+from pathlib import Path
+from typing import List
+
+from llvmlite import binding as llvm
+
+from src.ast import Module
+from src.context.compilation_ctx import CompilationCtx
+from src.context.error_ctx import CompilationInterrupted
+from src.gen.defs import PRINT_INT_FN_NAME, PRINT_BOOL_FN_NAME, PRINT_STR_FN_NAME, OUT_MAIN_FN_NAME
+from src.gen.emit import parse_ir, optimize, target_machine
+from src.gen.generate import generate_module, generate_start_module
+
+
+# Host implementations of runtime/console.c
+# They write to sys.stdout, so the output of a JIT-executed program can be redirected like any other Python output
+
+@ctypes.CFUNCTYPE(None, ctypes.c_int32)
+def host_print_int(i: int):
+    sys.stdout.write(str(i))
+
+
+@ctypes.CFUNCTYPE(None, ctypes.c_int8)
+def host_print_bool(b: int):
+    sys.stdout.write("false" if b == 0 else "true")
+
+
+@ctypes.CFUNCTYPE(None, ctypes.c_char_p)
+def host_print_str(s: bytes):
+    sys.stdout.write(s.decode("utf-8"))
+
+
+HOST_FUNCTIONS = {
+    PRINT_INT_FN_NAME: host_print_int,
+    PRINT_BOOL_FN_NAME: host_print_bool,
+    PRINT_STR_FN_NAME: host_print_str,
+}
+
+__host_functions_added = False
+
+
+def add_host_functions():
+    global __host_functions_added
+    if not __host_functions_added:
+        for name, fn in HOST_FUNCTIONS.items():
+            llvm.add_symbol(name, ctypes.cast(fn, ctypes.c_void_p).value)
+        __host_functions_added = True
+
+
+class JitProgram:
+    """
+    A program compiled to machine code in the memory of the compiler process.
+    The engine owns the module, the target machine and the machine code, close the program to free them.
+    """
+    engine: llvm.ExecutionEngine
+
+    def __init__(self, engine: llvm.ExecutionEngine):
+        self.engine = engine
+
+    def run(self):
+        assert not self.engine.closed
+        entry = ctypes.CFUNCTYPE(None)(self.engine.get_function_address(OUT_MAIN_FN_NAME))
+        entry()
+        sys.stdout.flush()
+
+    def close(self):
+        if not self.engine.closed:
+            self.engine.close()
+
+    def __enter__(self) -> 'JitProgram':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def jit_compile(ctx: CompilationCtx, entry: Path, modules: List[Module]) -> JitProgram:
+    """
+    Compiles normalized modules with MCJIT, the runtime is replaced by the host functions.
+    :param entry: the file of the module whose entrypoint the program runs
+    """
+    ll_module = parse_ir(str(generate_start_module(entry)))
+    for m in modules:
+        with ctx.phase("generate", str(m.path)):
+            try:
+                ll_part = parse_ir(str(generate_module(ctx, m)))
+            except RuntimeError as e:
+                raise CompilationInterrupted(f"LLVM rejected the generated module {m.unique_name}:\n{e}")
+        ll_module.link_in(ll_part)
+
+    with ctx.phase("optimize"):
+        optimize(ll_module, ctx.options.opt_level, ctx.options.passes)
+    with ctx.phase("jit"):
+        add_host_functions()
+        engine = llvm.create_mcjit_compiler(ll_module, target_machine(ctx.options.opt_level, jit=True))
+        engine.finalize_object()
+    return JitProgram(engine)
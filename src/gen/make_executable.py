@@ -1,28 +1,162 @@
+import hashlib
+import os
+import re
+import shutil
 import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import List, Tuple, Callable, Dict
 
-from src.defs.constants import LL_FILE_EXT, BUILD_DIR_NAME
+from src.defs.constants import BUILD_DIR_NAME, OBJ_FILE_EXT, C_FILE_EXT, BC_FILE_EXT, SHARED_LIB_EXT
 from src.context.compilation_ctx import CompilationCtx
 from src.context.error_ctx import CompilationInterrupted
+from src.gen.emit import emit_module, emit_lto_object
 
 
-def make_executable(compiler: CompilationCtx, ll_files: List[Path]):
-    ll_files = [str(path.absolute()) for path in (get_runtime_ll_files(compiler) + ll_files)]
-    result = subprocess.run(
-        f"clang-14 {(' '.join(ll_files))} -o {str(compiler.outpath)}",
-        cwd=Path.cwd(),
-        shell=True,
-        text=True,
-        capture_output=True
-    )
+def make_executables(compiler: CompilationCtx, programs: List[Tuple[List[Path], Path]]):
+    """
+    Links several programs at once.
+    :param programs: pairs of (object files, output executable)
+    """
+    with ThreadPoolExecutor(max_workers=compiler.options.jobs) as pool:
+        results = list(pool.map(link_executable, *zip(*programs)))
+    errors = [error for error in results if error is not None]
+    if len(errors) > 0:
+        raise CompilationInterrupted("\n".join(errors))
+
+
+def link_executable(obj_files: List[Path], outpath: Path) -> str | None:
+    """
+    :return: error message or None
+    """
+    try:
+        result = subprocess.run(
+            ["clang-14", *[str(path.absolute()) for path in obj_files], "-o", str(outpath)],
+            cwd=Path.cwd(),
+            text=True,
+            capture_output=True
+        )
+    except OSError as e:
+        return f"cannot run clang-14: {e}"
     if result.returncode != 0:
-        raise CompilationInterrupted(f"clang returned non-null exit code:\n{result.stdout}\n{result.stderr}")
+        return f"clang returned non-null exit code:\n{result.stdout}\n{result.stderr}"
+    return None
+
+
+def make_library(obj_files: List[Path], outpath: Path):
+    """
+    Packs the objects into a static library or, if outpath ends with SHARED_LIB_EXT, links a shared one.
+    """
+    if outpath.suffix == SHARED_LIB_EXT:
+        command = ["clang-14", "-shared", *[str(path.absolute()) for path in obj_files], "-o", str(outpath)]
+    else:
+        # the archive is recreated, otherwise objects of removed modules would stay in it
+        outpath.unlink(missing_ok=True)
+        command = ["llvm-ar-14", "rcs", str(outpath), *[str(path.absolute()) for path in obj_files]]
+    try:
+        result = subprocess.run(command, text=True, capture_output=True)
+    except OSError as e:
+        raise CompilationInterrupted(f"cannot run {command[0]}: {e}")
+    if result.returncode != 0:
+        raise CompilationInterrupted(f"{command[0]} returned non-null exit code:\n{result.stdout}\n{result.stderr}")
+
+
+def compile_objects(compiler: CompilationCtx, ir_jobs: List[Tuple[str, Dict[str, Path]]],
+                    clang_jobs: List[Tuple[Path, Path]] = (), lto_jobs: List[Tuple[List[Path], Path]] = ()):
+    """
+    Compiles modules to object files, several modules are compiled at once.
+    :param ir_jobs: pairs of (generated module IR, --emit kind -> output file), compiled in-process by LLVM
+    :param clang_jobs: pairs of (input source file, output object or bitcode file), compiled by clang
+    :param lto_jobs: pairs of (bitcode files of a program, output object file), merged and optimized by LLVM
+    """
+    opt_level, passes = compiler.options.opt_level, compiler.options.passes
+    calls: List[Tuple[Callable[..., str | None], Tuple]] = \
+        [(emit_module, (*job, opt_level, passes)) for job in ir_jobs] + \
+        [(compile_object, (*job, opt_level)) for job in clang_jobs] + \
+        [(emit_lto_object, (*job, opt_level, passes)) for job in lto_jobs]
+    if compiler.options.jobs > 1 and len(calls) > 1:
+        with ProcessPoolExecutor(max_workers=min(compiler.options.jobs, len(calls))) as pool:
+            futures = [pool.submit(fn, *args) for fn, args in calls]
+            results = [future.result() for future in futures]
+    else:
+        results = [fn(*args) for fn, args in calls]
+    errors = [error for error in results if error is not None]
+    if len(errors) > 0:
+        raise CompilationInterrupted("\n".join(errors))
+
+
+def compile_object(src_file: Path, obj_file: Path, opt_level: int = 0) -> str | None:
+    """
+    Runs in a worker process.
+    :param obj_file: LLVM bitcode is written instead of machine code if its extension is BC_FILE_EXT
+    :return: error message or None
+    """
+    # optnone would keep the functions from being optimized after they are merged into the program
+    bitcode_flags = ["-emit-llvm", "-Xclang", "-disable-O0-optnone"] if obj_file.suffix == BC_FILE_EXT else []
+    try:
+        result = subprocess.run(
+            ["clang-14", f"-O{opt_level}", *bitcode_flags, "-c", str(src_file.absolute()), "-o",
+             str(obj_file.absolute())],
+            text=True,
+            capture_output=True
+        )
+    except OSError as e:
+        return f"cannot run clang-14 to compile {src_file}: {e}"
+    if result.returncode != 0:
+        return f"clang returned non-null exit code while compiling {src_file}:\n{result.stdout}\n{result.stderr}"
+    return None
+
+
+def get_runtime_obj_files(compiler: CompilationCtx, bitcode: bool = False) -> List[Path]:
+    """
+    The runtime is compiled once for every version of its sources and optimization level,
+    the objects are cached in the runtime build directory.
+    :param bitcode: compile the runtime to LLVM bitcode for link-time optimization
+    """
+    runtime_sources = sorted(compiler.project.runtime.glob("*" + C_FILE_EXT))
+    if len(runtime_sources) == 0:
+        raise CompilationInterrupted(f"cannot find runtime sources in {compiler.project.runtime}")
+    h = hashlib.sha256()
+    for path in runtime_sources:
+        h.update(path.name.encode("utf-8"))
+        h.update(path.read_bytes())
+    ext = BC_FILE_EXT if bitcode else OBJ_FILE_EXT
+    sources_hash = h.hexdigest()[:16]
+    artifacts_dir = compiler.project.runtime / BUILD_DIR_NAME / \
+        f"{sources_hash}-O{compiler.options.opt_level}{ext.replace('.', '-')}"
+    obj_files = [artifacts_dir / (path.stem + ext) for path in runtime_sources]
+    if artifacts_dir.parent.is_dir():
+        remove_stale_runtime_builds(artifacts_dir.parent, sources_hash)
+    if artifacts_dir.is_dir():
+        return obj_files
+
+    # build in a private directory and publish it at once, other compilers may be building it concurrently
+    tmp_dir = artifacts_dir.with_name(f"{artifacts_dir.name}.{os.getpid()}.tmp")
+    try:
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        compile_objects(compiler, [], [(path, tmp_dir / (path.stem + ext)) for path in runtime_sources])
+        os.replace(tmp_dir, artifacts_dir)
+    except OSError as e:
+        # another compiler may have published the same directory first
+        if not artifacts_dir.is_dir():
+            raise CompilationInterrupted(f"cannot build the runtime in {artifacts_dir}: {e}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return obj_files
 
 
-def get_runtime_ll_files(compiler: CompilationCtx) -> List[Path]:
-    runtime_artifacts_dir = compiler.project.runtime / BUILD_DIR_NAME
-    runtime_ll_files = list(runtime_artifacts_dir.glob("*" + LL_FILE_EXT))
-    if len(runtime_ll_files) == 0:
-        raise CompilationInterrupted(f"cannot find runtime artifacts in {runtime_artifacts_dir}")
-    return runtime_ll_files
+def remove_stale_runtime_builds(build_dir: Path, sources_hash: str):
+    """
+    Deletes the builds of older runtime sources and the files of older compiler versions,
+    which built the runtime to other paths.
+    """
+    # the builds of the current sources, published or still being built by another compiler
+    suffixes = "|".join(ext.replace(".", "-") for ext in (OBJ_FILE_EXT, BC_FILE_EXT))
+    current = re.compile(rf"{sources_hash}-O\d+({suffixes})(\.\d+\.tmp)?")
+    for path in build_dir.iterdir():
+        if current.fullmatch(path.name):
+            continue
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
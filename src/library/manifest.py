@@ -0,0 +1,134 @@
+import dataclasses
+import json
+from pathlib import Path
+from typing import Dict, List, Union
+
+from src.ast import Module, FunDecl, VarDecl, ArgDecl, StmtBlock, Decl
+from src.cache.build_cache import file_hash
+from src.context.error_ctx import CompilationInterrupted
+from src.defs.constants import COMPILER_VERSION
+from src.span import INVALID_SPAN
+from src.ty import Ty, TyFunc, TyPrimitive, primitive_ty
+
+FUN_KIND = "fun"
+VAR_KIND = "var"
+
+
+@dataclasses.dataclass
+class LibraryModule:
+    path: str  # absolute path of the source file, the symbols of the module are derived from it
+    declarations: Dict[str, dict]  # name -> {"kind": FUN_KIND or VAR_KIND, "type": serialized type}
+
+
+@dataclasses.dataclass
+class LibraryManifest:
+    """
+    Declarations of the modules compiled into a static or shared library,
+    programs that import these modules are type checked against them and linked with the library.
+    """
+    library: Path
+    key: str  # hash of the library file, changes whenever the library is rebuilt
+    modules: List[LibraryModule]
+
+
+def manifest_path(library: Path) -> Path:
+    return library.with_suffix(".json")
+
+
+def write_manifest(library: Path, modules: List[Module]) -> Path:
+    """
+    :param modules: normalized modules compiled into the library
+    :return: path of the manifest, next to the library
+    """
+    data = {
+        "version": COMPILER_VERSION,
+        "library": library.name,
+        "key": file_hash(library),
+        "modules": [dataclasses.asdict(LibraryModule(
+            path=str(mod.path.absolute()),
+            declarations=module_declarations(mod),
+        )) for mod in modules],
+    }
+    path = manifest_path(library)
+    path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    return path
+
+
+def module_declarations(mod: Module) -> Dict[str, dict]:
+    """
+    :return: the declarations other modules can use, see LibraryModule
+    """
+    return {d.declared_name(): declaration_to_json(d) for d in mod.top_level_decls if isinstance(d, (FunDecl, VarDecl))}
+
+
+def load_manifest(path: Path) -> LibraryManifest:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise CompilationInterrupted(f"{path}: Cannot read the library manifest: {e}")
+    try:
+        if data["version"] != COMPILER_VERSION:
+            raise CompilationInterrupted(f"{path}: The library was built by another version of the compiler "
+                                         f"({data['version']}), rebuild it")
+        library = path.parent / data["library"]
+        modules = [LibraryModule(**m) for m in data["modules"]]
+        for m in modules:
+            for d in m.declarations.values():
+                declaration_from_json(d)
+    except (KeyError, TypeError, ValueError):
+        raise CompilationInterrupted(f"{path}: Broken library manifest")
+    if file_hash(library) != data["key"]:
+        raise CompilationInterrupted(f"{path}: The library {library} is missing or does not match the manifest, "
+                                     f"rebuild it")
+    return LibraryManifest(library=library, key=data["key"], modules=modules)
+
+
+def stub_module(m: LibraryModule) -> Module:
+    """
+    Creates a module that only holds the declarations of a library module or of a module that is up to date
+    in the build cache, it is neither normalized nor generated.
+    """
+    decls: List[Decl] = []
+    for name, d in m.declarations.items():
+        ty = declaration_from_json(d)
+        if d["kind"] == FUN_KIND:
+            decls.append(FunDecl(
+                name=name,
+                args=[ArgDecl(name=f"arg{i}", ty=arg_ty, span=INVALID_SPAN) for i, arg_ty in enumerate(ty.args)],
+                body=StmtBlock(stmts=[], span=INVALID_SPAN),
+                ret_ty=ty.ret,
+                span=INVALID_SPAN
+            ))
+        else:
+            decls.append(VarDecl(name=name, initializer=None, ty=ty, span=INVALID_SPAN))
+    mod = Module(path=Path(m.path), imports=[], top_level_decls=decls, entry=None, span=INVALID_SPAN)
+    for d in decls:
+        d.parent = mod
+        mod.declare(d)
+    return mod
+
+
+def declaration_to_json(d: Union[FunDecl, VarDecl]) -> dict:
+    return {"kind": FUN_KIND if isinstance(d, FunDecl) else VAR_KIND, "type": ty_to_json(d.value_ty())}
+
+
+def declaration_from_json(d: dict) -> Ty:
+    ty = ty_from_json(d["type"])
+    if d["kind"] not in (FUN_KIND, VAR_KIND) or (d["kind"] == FUN_KIND) != isinstance(ty, TyFunc):
+        raise ValueError(f"unexpected declaration: {d}")
+    return ty
+
+
+def ty_to_json(ty: Ty) -> Union[str, dict]:
+    if isinstance(ty, TyPrimitive):
+        return ty.name
+    elif isinstance(ty, TyFunc):
+        return {"args": [ty_to_json(arg) for arg in ty.args], "ret": ty_to_json(ty.ret)}
+    else:
+        assert False, f"unexpected type: {ty}"
+
+
+def ty_from_json(data: Union[str, dict]) -> Ty:
+    if isinstance(data, str):
+        return primitive_ty(data)
+    return TyFunc(args=[ty_from_json(arg) for arg in data["args"]], ret=ty_from_json(data["ret"]))
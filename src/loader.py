@@ -1,35 +1,100 @@
+import collections
+import dataclasses
 import graphlib
 import os.path
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from typing import Dict, List
+from typing import Deque, Dict, List, Tuple
 
 from src.ast import Import, Module
+from src.cache import ast_cache
+from src.cache.ast_cache import DiskAstCache, MemoryAstCache
+from src.cache.build_cache import file_hash
 from src.defs.constants import HERB_FILE_EXT
 from src.context.compilation_ctx import CompilationCtx
-from src.context.error_ctx import CompilationInterrupted
+from src.context.error_ctx import CompilationInterrupted, CompilationError, ErrorCtx
+from src.context.options_ctx import OptionsCtx
+from src.context.project_ctx import ProjectCtx
+from src.library.manifest import LibraryModule, stub_module
 from src.parser import parse
 
 
+@dataclasses.dataclass
+class ParsedFile:
+    data: bytes | None  # serialized module, None if parsing failed
+    errors: List[CompilationError]
+    interrupted: bool  # the file has syntax errors
+
+
+def parse_file(project: ProjectCtx, parser: str, path: Path) -> ParsedFile:
+    """
+    Runs in a worker process.
+    """
+    compiler = CompilationCtx(project=project, errors=ErrorCtx(), options=OptionsCtx(parser=parser, jobs=1))
+    try:
+        module = parse(compiler, path)
+    except CompilationInterrupted:
+        return ParsedFile(data=None, errors=compiler.errors.errors, interrupted=True)
+    return ParsedFile(data=ast_cache.dump_module(module), errors=compiler.errors.errors, interrupted=False)
+
+
+def usable_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def prefetch_workers(jobs: int) -> int:
+    """
+    The compiler process decodes every module parsed by a worker, which takes about half as long as parsing it,
+    so it counts as one of the jobs. There are no more jobs than CPUs, on a single CPU the files are parsed in-process.
+    """
+    return min(jobs, usable_cpus()) - 1
+
+
 class Loader:
     compiler: CompilationCtx
     __loaded: Dict[Path, Module]
+    __prebuilt_modules: Dict[Path, LibraryModule]  # modules of libraries and of the build cache, they are stubbed
+    __stubs: Dict[Path, Module]
+    __prefetched: Dict[Path, Tuple[Module | None, List[CompilationError]]]  # parsed but not loaded files
+    ast_cache: DiskAstCache | None
 
-    def __init__(self, compiler: CompilationCtx):
+    def __init__(self, compiler: CompilationCtx, ast_cache: DiskAstCache | None = None):
+        """
+        :param ast_cache: parsed modules are taken from and stored in it
+        """
         self.compiler = compiler
+        self.ast_cache = ast_cache
         self.__loaded = dict()
+        self.__prebuilt_modules = {Path(m.path): m for lib in compiler.options.libraries for m in lib.modules}
+        self.__stubs = dict()
+        self.__prefetched = dict()
+
+    def add_prebuilt_modules(self, modules: Dict[Path, Dict[str, dict]]):
+        """
+        The modules are not loaded, the files that import them get stubs with their declarations instead,
+        like for the modules of prebuilt libraries.
+        :param modules: absolute path -> declarations, see LibraryModule
+        """
+        for path, declarations in modules.items():
+            self.__prebuilt_modules[path] = LibraryModule(path=str(path), declarations=declarations)
 
     def get_loaded_modules(self) -> List[Module]:
         """
-        Topologically sorts the modules
+        Topologically sorts the modules, prebuilt modules are not included
         :return:
         """
-        assert len(self.__loaded) > 0
+        if len(self.__loaded) == 0:
+            # every module was taken from the build cache
+            return []
         # build graph
         graph = dict()
         for path, mod in self.__loaded.items():
             graph[path] = set()
             for imp in mod.imports:
-                graph[path].add(imp.resolved_path())
+                if imp.resolved_path().absolute() in self.__loaded:
+                    graph[path].add(imp.resolved_path().absolute())
         # sort
         try:
             order = list(graphlib.TopologicalSorter(graph).static_order())
@@ -47,42 +112,218 @@ class Loader:
         return [self.__loaded[path] for path in order]
 
     def load_file(self, path: Path) -> Module:
+        return self.load_files([path])[0]
+
+    def load_files(self, paths: List[Path]) -> List[Module]:
+        """
+        Loads the files and the files they import.
+        With several jobs all of them are parsed by worker processes first, see __prefetch.
+        """
+        workers = prefetch_workers(self.compiler.options.jobs)
+        if workers > 0:
+            with self.compiler.phase("prefetch"):
+                self.__prefetch([path for path in paths if path.is_file()], workers)
+        return [self.__load_file(path) for path in paths]
+
+    def __load_file(self, path: Path) -> Module:
         if not path.is_file():
             raise CompilationInterrupted(f"File not found: {path}")
-        if path in self.__loaded:
-            return self.__loaded[path]
-        module = parse(self.compiler, path)
-        self.__loaded[path] = module
+        key = path.absolute()
+        if key in self.__loaded:
+            return self.__loaded[key]
+        with self.compiler.phase("parse", str(path)):
+            module = self.__parse(path)
+        self.__loaded[key] = module
         self.__load_imported(module)
         return module
 
+    def __prefetch(self, paths: List[Path], workers: int):
+        """
+        Parses the files and everything they import before they are loaded, walking the imports breadth-first:
+        a file is sent to a worker process as soon as a file that imports it is parsed, so a wide import graph
+        takes about as long as its longest chain of imports. Nothing is reported here, the errors of a file
+        are reported when it is loaded, in the same order as when the files are parsed one by one.
+        Files that cannot be prefetched are parsed when they are loaded.
+        """
+        queue: Deque[Path] = collections.deque(paths)
+        seen = set()
+        pending: Dict[Future, Tuple[Path, str | None]] = dict()
+        pool = None
+        try:
+            while len(queue) > 0 or len(pending) > 0:
+                while len(queue) > 0:
+                    path = queue.popleft()
+                    key = path.absolute()
+                    if key in seen or key in self.__loaded or key in self.__prebuilt_modules or not path.is_file():
+                        continue
+                    seen.add(key)
+                    source_hash = file_hash(path) if self.__is_caching() else None
+                    module = self.__load_cached(path, source_hash)
+                    if module is not None:
+                        self.__prefetched[key] = (module, [])
+                        queue.extend(self.__imported_files(module))
+                    elif pool is None and len(queue) == 0 and len(pending) == 0:
+                        # a single file is parsed here, the workers are only started for several
+                        with self.compiler.phase("parse", str(path)):
+                            module, errors = self.__parse_collecting_errors(path, source_hash)
+                        self.__prefetched[key] = (module, errors)
+                        if module is not None:
+                            queue.extend(self.__imported_files(module))
+                    else:
+                        if pool is None:
+                            pool = ProcessPoolExecutor(max_workers=workers)
+                        future = pool.submit(parse_file, self.compiler.project, self.compiler.options.parser, path)
+                        pending[future] = (path, source_hash)
+                if len(pending) > 0:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path, source_hash = pending.pop(future)
+                        with self.compiler.phase("parse", str(path)):
+                            module = self.__add_parsed_file(path, source_hash, future)
+                        if module is not None:
+                            queue.extend(self.__imported_files(module))
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    def __add_parsed_file(self, path: Path, source_hash: str | None, future: 'Future[ParsedFile]') -> Module | None:
+        """
+        :return: the module parsed by a worker, None if it was not parsed
+        """
+        try:
+            parsed = future.result()
+        except Exception:
+            # the file is parsed again when it is loaded, which reports the failure
+            return None
+        if parsed.interrupted:
+            self.__prefetched[path.absolute()] = (None, parsed.errors)
+            return None
+        module = ast_cache.load_module(parsed.data, path)
+        self.__prefetched[path.absolute()] = (module, parsed.errors)
+        if len(parsed.errors) == 0 and source_hash is not None:
+            self.__store_cached(path, source_hash, parsed.data)
+        return module
+
+    def __parse_collecting_errors(self, path: Path, source_hash: str | None) \
+            -> Tuple[Module | None, List[CompilationError]]:
+        compiler = dataclasses.replace(self.compiler, errors=ErrorCtx())
+        try:
+            module = parse(compiler, path)
+        except CompilationInterrupted:
+            return None, compiler.errors.errors
+        if len(compiler.errors.errors) == 0 and source_hash is not None:
+            self.__store_cached(path, source_hash, ast_cache.dump_module(module))
+        return module, compiler.errors.errors
+
+    def __imported_files(self, module: Module) -> List[Path]:
+        paths = []
+        for i in module.imports:
+            path = self.__try_resolve_path(i)
+            if path is not None:
+                paths.append(path)
+        return paths
+
+    def __parse(self, path: Path) -> Module:
+        prefetched = self.__prefetched.pop(path.absolute(), None)
+        if prefetched is not None:
+            module, errors = prefetched
+            for error in errors:
+                self.compiler.add_error(error)
+            if module is None:
+                raise CompilationInterrupted()
+            return module
+        if not self.__is_caching():
+            return parse(self.compiler, path)
+        source_hash = file_hash(path)
+        module = self.__load_cached(path, source_hash)
+        if module is not None:
+            return module
+        errors = len(self.compiler.errors.errors)
+        module = parse(self.compiler, path)
+        # a module with errors is parsed again to report them
+        if source_hash is not None and len(self.compiler.errors.errors) == errors:
+            self.__store_cached(path, source_hash, ast_cache.dump_module(module))
+        return module
+
+    def __is_caching(self) -> bool:
+        return self.__memory_cache() is not None or self.ast_cache is not None
+
+    def __memory_cache(self) -> MemoryAstCache | None:
+        """
+        :return: the cache of the daemon, None outside of it or with --no-cache
+        """
+        return ast_cache.memory_ast_cache if self.compiler.options.use_cache else None
+
+    def __store_cached(self, path: Path, source_hash: str, data: bytes):
+        memory_cache = self.__memory_cache()
+        if memory_cache is not None:
+            memory_cache.put(path, source_hash, data)
+        if self.ast_cache is not None:
+            self.ast_cache.put(source_hash, data)
+
+    def __load_cached(self, path: Path, source_hash: str | None) -> Module | None:
+        if source_hash is None:
+            return None
+        memory_cache = self.__memory_cache()
+        data = memory_cache.get(path, source_hash) if memory_cache is not None else None
+        if data is None and self.ast_cache is not None:
+            data = self.ast_cache.get(source_hash)
+            if data is not None and memory_cache is not None:
+                memory_cache.put(path, source_hash, data)
+        if data is None:
+            return None
+        try:
+            return ast_cache.load_module(data, path)
+        except ValueError:
+            # a broken file, it is replaced after parsing
+            if self.ast_cache is not None:
+                self.ast_cache.remove(source_hash)
+            return None
+
     def __load_imported(self, module: Module):
         for imp in module.imports:
             self.__load_import(imp)
 
     def __load_import(self, i: Import):
         path = self.__resolve_path(i)
+        if path.absolute() in self.__prebuilt_modules:
+            i.imported_module = self.__load_stub(path.absolute())
+            return
         if not path.is_file():
             self.compiler.add_error_to_node(i, f"File not found {i.import_path()}",
                                             f"path was resolved as {path.absolute()}")
             raise CompilationInterrupted()
-        i.imported_module = self.load_file(path)
+        i.imported_module = self.__load_file(path)
+
+    def __load_stub(self, path: Path) -> Module:
+        if path not in self.__stubs:
+            self.__stubs[path] = stub_module(self.__prebuilt_modules[path])
+        return self.__stubs[path]
 
     def __resolve_path(self, i: Import) -> Path:
+        path = self.__try_resolve_path(i)
+        if path is None:
+            root_package = i.path[0]
+            self.compiler.add_error_to_node(
+                node=i,
+                message=f"Root package '{root_package}' could not be resolved in '{i.import_path()}'",
+                hint=f"This is an absolute import. It is resolved relative to the first package in the path, '{root_package}'. "
+                     f"If you wanted a relative import then try '.{i.import_path()}' or define the root package."
+            )
+            raise CompilationInterrupted()
+        return path
+
+    def __try_resolve_path(self, i: Import) -> Path | None:
+        """
+        :return: None if the root package of an absolute import is unknown
+        """
         assert len(i.path) > 0
 
         if i.is_relative:
             root = self.compiler.project.root
         else:
-            root_package = i.path[0]
-            if root_package not in self.compiler.project.root_packages:
-                self.compiler.add_error_to_node(
-                    node=i,
-                    message=f"Root package '{root_package}' could not be resolved in '{i.import_path()}'",
-                    hint=f"This is an absolute import. It is resolved relative to the first package in the path, '{root_package}'. "
-                         f"If you wanted a relative import then try '.{i.import_path()}' or define the root package."
-                )
-                raise CompilationInterrupted()
+            if i.path[0] not in self.compiler.project.root_packages:
+                return None
             root = self.compiler.project.root_packages[i.path[0]]
 
         path_tail = ""
@@ -0,0 +1,152 @@
+import contextlib
+import dataclasses
+import tracemalloc
+from typing import Counter, Dict, Iterator, List, Tuple, TYPE_CHECKING
+
+from src.ast import Module, Node, AstWalker
+from src.profiler import COMPILER_LANE
+
+if TYPE_CHECKING:
+    from llvmlite import ir
+
+TOP_ALLOCATION_SITES = 10
+TOP_NODE_CLASSES = 15
+
+
+@dataclasses.dataclass
+class MemoryStats:
+    peak: int = 0  # bytes allocated at the peak of the phase, above what was allocated when it started
+    retained: int = 0  # bytes that the phase left allocated
+
+    def add(self, other: 'MemoryStats'):
+        # the phases run one after another, so their peaks do not add up
+        self.peak = max(self.peak, other.peak)
+        self.retained += other.retained
+
+
+class NodeClassCounter(AstWalker):
+    counts: Counter[str]
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def walk_node(self, n: 'Node'):
+        self.counts[type(n).__name__] += 1
+        super().walk_node(n)
+
+
+class MemoryReport:
+    """
+    Traces the allocations of the compiler with tracemalloc: the peak and the retained memory of every phase
+    of every module, the files that allocated the memory still in use at the end, the sizes of the ASTs and the IR.
+    """
+    stats: Dict[Tuple[str, str], MemoryStats]  # (lane, phase) -> stats
+    nodes: Counter[str]  # Node subclass -> number of nodes in the normalized modules
+    instructions: Dict[str, Counter[str]]  # module -> opcode -> number of instructions in the generated IR
+    snapshot: tracemalloc.Snapshot | None
+    __frames: List[List[int]]  # [allocated at the start, peak so far] of the running phases
+
+    def __init__(self):
+        self.stats = dict()
+        self.nodes = Counter()
+        self.instructions = dict()
+        self.snapshot = None
+        self.__frames = []
+        self.__final = 0
+        self.__peak = 0
+        tracemalloc.start()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, lane: str = COMPILER_LANE) -> Iterator[None]:
+        """
+        tracemalloc has a single peak, so it is reset for every phase and the peaks of the enclosing phases
+        are kept aside.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        if len(self.__frames) > 0:
+            self.__frames[-1][1] = max(self.__frames[-1][1], peak)
+        tracemalloc.reset_peak()
+        self.__frames.append([current, current])
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            start, frame_peak = self.__frames.pop()
+            frame_peak = max(frame_peak, peak)
+            if len(self.__frames) > 0:
+                self.__frames[-1][1] = max(self.__frames[-1][1], frame_peak)
+            stats = MemoryStats(peak=frame_peak - start, retained=current - start)
+            self.stats.setdefault((lane, name), MemoryStats()).add(stats)
+
+    def count_nodes(self, module: Module):
+        counter = NodeClassCounter()
+        counter.walk(module)
+        self.nodes.update(counter.counts)
+
+    def count_instructions(self, module: Module, ir_module: 'ir.Module'):
+        counts = Counter(instr.opname for fn in ir_module.functions for block in fn.blocks
+                         for instr in block.instructions)
+        self.instructions.setdefault(str(module.path), Counter()).update(counts)
+
+    def stop(self):
+        """
+        Takes the snapshot of the memory in use and stops tracing.
+        """
+        self.snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ])
+        self.__final, self.__peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    def report(self) -> str:
+        per_phase: Dict[str, MemoryStats] = dict()
+        for (lane, name), stats in self.stats.items():
+            per_phase.setdefault(name, MemoryStats()).add(stats)
+
+        lines = ["===== Memory =====", format_memory_header("phase")]
+        for name, stats in sorted(per_phase.items(), key=lambda item: -item[1].peak):
+            lines.append(format_memory(name, stats))
+        lines.append("")
+        lines.append(format_memory_header("module: phase"))
+        module_stats = [(lane, name, stats) for (lane, name), stats in self.stats.items() if lane != COMPILER_LANE]
+        for lane, name, stats in sorted(module_stats, key=lambda item: -item[2].peak):
+            lines.append(format_memory(f"{lane}: {name}", stats))
+        lines.append(f"peak: {kib(self.__peak)} KiB, in use at the end: {kib(self.__final)} KiB")
+
+        if self.snapshot is not None:
+            lines.append("")
+            lines.append(f"{'in use, KiB':>12} {'blocks':>10}  allocated in")
+            for stat in self.snapshot.statistics("filename")[:TOP_ALLOCATION_SITES]:
+                lines.append(f"{kib(stat.size):>12} {stat.count:10}  {stat.traceback[0].filename}")
+
+        lines.append("")
+        lines.append(f"{'nodes':>10}  class")
+        for cls, count in self.nodes.most_common(TOP_NODE_CLASSES):
+            lines.append(f"{count:10}  {cls}")
+        lines.append(f"{sum(self.nodes.values()):10}  total")
+
+        if len(self.instructions) > 0:
+            opcodes = sum(self.instructions.values(), Counter())
+            lines.append("")
+            lines.append(f"{'IR instrs':>10}  module")
+            for module, counts in sorted(self.instructions.items(), key=lambda item: -item[1].total()):
+                lines.append(f"{counts.total():10}  {module}")
+            lines.append(f"{'IR instrs':>10}  opcode")
+            for opcode, count in opcodes.most_common():
+                lines.append(f"{count:10}  {opcode}")
+            lines.append(f"{opcodes.total():10}  total")
+        return "\n".join(lines)
+
+
+def kib(size: int) -> str:
+    return f"{size / 1024:.1f}"
+
+
+def format_memory_header(title: str) -> str:
+    return f"{'peak, KiB':>12} {'retained, KiB':>14}  {title}"
+
+
+def format_memory(title: str, stats: MemoryStats) -> str:
+    return f"{kib(stats.peak):>12} {kib(stats.retained):>14}  {title}"
@@ -4,21 +4,52 @@ from src.context.compilation_ctx import CompilationCtx
 from src.context.error_ctx import CompilationInterrupted
 from src.normalize.builtins import builtins
 from src.normalize.check_main import check_main
-from src.normalize.resolve import resolve
-from src.normalize.typecheck import typecheck
+from src.normalize.pass_manager import Pass, PassManager
+from src.normalize.resolve import reorder_top_level_decls, check_constants, resolve_names
+from src.normalize.typecheck import typecheck, check_function_termination
 
 
-def normalize(ctx: CompilationCtx, module: Module, is_entry: bool = False):
-    module = resolve(ctx, module)
+def normalize(ctx: CompilationCtx, module: Module, is_entry: bool = False, pm: PassManager | None = None):
+    pm = pm if pm is not None else create_normalize_pass_manager()
+    with ctx.phase("normalize", str(module.path)):
+        module = pm.run(ctx, module, is_entry)
+    if ctx.memory is not None:
+        ctx.memory.count_nodes(module)
+    if ctx.has_errors():
+        raise CompilationInterrupted()
+    if not is_entry:
+        module.entry = None
+
+
+def create_normalize_pass_manager() -> PassManager:
+    return PassManager([
+        Pass("reorder-decls", reorder_decls_pass),
+        Pass("check-constants", lambda ctx, m, is_entry: check_constants(ctx, m), stop_on_errors=True),
+        Pass("resolve", lambda ctx, m, is_entry: resolve_names(ctx, m), stop_on_errors=True),
+        Pass("set-parents", set_parents_pass),
+        Pass("check-entrypoint", check_entrypoint_pass),
+        Pass("builtins", lambda ctx, m, is_entry: builtins(ctx, m)),
+        Pass("set-parents", set_parents_pass),
+        Pass("typecheck", lambda ctx, m, is_entry: typecheck(ctx, m)),
+        Pass("function-termination", lambda ctx, m, is_entry: check_function_termination(ctx, m)),
+    ])
+
+
+def reorder_decls_pass(ctx: CompilationCtx, module: Module, is_entry: bool) -> Module:
+    reorder_top_level_decls(module)
+    return module
+
+
+def set_parents_pass(ctx: CompilationCtx, module: Module, is_entry: bool) -> Module:
+    set_parents(module)
+    return module
+
+
+def check_entrypoint_pass(ctx: CompilationCtx, module: Module, is_entry: bool) -> Module:
     if is_entry and module.entry is None:
         ctx.add_error_to_node(
             node=module,
             message="Module must have an entrypoint defined",
             hint="Use the 'entrypoint {}' construction"
         )
-    module = builtins(ctx, module)
-    module = typecheck(ctx, module)
-    if ctx.has_errors():
-        raise CompilationInterrupted()
-    if not is_entry:
-        module.entry = None
+    return module
@@ -1,13 +1,10 @@
 from src.ast import FunCall, Module, AstTransformer, Node, IdentExpr, Expr
 from src.ast.builtins import Print, PrintBuiltinDecl
-from src.ast.fixverify import set_parents
 from src.context.compilation_ctx import CompilationCtx
 
 
-def builtins(ctx: CompilationCtx, mod: Module):
-    mod = mod.accept(PrintTransformer(ctx), None)
-    set_parents(mod)
-    return mod
+def builtins(ctx: CompilationCtx, mod: Module) -> Module:
+    return mod.accept(PrintTransformer(ctx), None)
 
 
 class PrintTransformer(AstTransformer):
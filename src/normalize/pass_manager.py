@@ -0,0 +1,131 @@
+import dataclasses
+import sys
+import time
+from typing import Callable, List, Dict, Tuple
+
+from src.ast import Module, Node, AstWalker
+from src.context.compilation_ctx import CompilationCtx
+from src.context.error_ctx import CompilationInterrupted
+
+# (compiler, module, is_entry) -> transformed module
+PassFn = Callable[[CompilationCtx, Module, bool], Module]
+# (pass, module) -> None
+PassHook = Callable[['Pass', Module], None]
+
+
+@dataclasses.dataclass
+class Pass:
+    name: str
+    run: PassFn
+    stop_on_errors: bool = False  # interrupt the compilation if there are errors after this pass
+
+
+class PassManager:
+    passes: List[Pass]
+    before_hooks: List[PassHook]
+    after_hooks: List[PassHook]
+
+    def __init__(self, passes: List[Pass]):
+        self.passes = list(passes)
+        self.before_hooks = []
+        self.after_hooks = []
+
+    def add_before_hook(self, hook: PassHook):
+        self.before_hooks.append(hook)
+
+    def add_after_hook(self, hook: PassHook):
+        self.after_hooks.append(hook)
+
+    def run(self, ctx: CompilationCtx, module: Module, is_entry: bool) -> Module:
+        for p in self.passes:
+            for hook in self.before_hooks:
+                hook(p, module)
+            module = p.run(ctx, module, is_entry)
+            for hook in self.after_hooks:
+                hook(p, module)
+            if p.stop_on_errors and ctx.has_errors():
+                raise CompilationInterrupted()
+        return module
+
+
+class NodeCounter(AstWalker):
+    count: int
+
+    def __init__(self):
+        self.count = 0
+
+    def walk_node(self, n: 'Node'):
+        self.count += 1
+        super().walk_node(n)
+
+
+def count_nodes(n: 'Node') -> int:
+    counter = NodeCounter()
+    counter.walk(n)
+    return counter.count
+
+
+@dataclasses.dataclass
+class PassStats:
+    seconds: float = 0.0
+    nodes: int = 0
+    allocated_blocks: int = 0
+
+    def add(self, other: 'PassStats'):
+        self.seconds += other.seconds
+        self.nodes += other.nodes
+        self.allocated_blocks += other.allocated_blocks
+
+
+class PassTimer:
+    """
+    Measures every pass on every module: wall time, nodes in the visited module and
+    the number of memory blocks the pass left allocated.
+    """
+    stats: Dict[Tuple[str, str], PassStats]  # (module, pass) -> stats
+    __started: Tuple[float, int, int]
+
+    def __init__(self):
+        self.stats = dict()
+
+    def install(self, pm: PassManager):
+        pm.add_before_hook(self.before)
+        pm.add_after_hook(self.after)
+
+    def before(self, p: Pass, module: Module):
+        # node counting is not measured
+        nodes = count_nodes(module)
+        self.__started = (time.perf_counter(), sys.getallocatedblocks(), nodes)
+
+    def after(self, p: Pass, module: Module):
+        seconds = time.perf_counter() - self.__started[0]
+        blocks = sys.getallocatedblocks() - self.__started[1]
+        key = (str(module.path), p.name)
+        self.stats.setdefault(key, PassStats()).add(PassStats(seconds, self.__started[2], blocks))
+
+    def report(self) -> str:
+        per_pass: Dict[str, PassStats] = dict()
+        per_module: Dict[str, PassStats] = dict()
+        for (module, name), stats in self.stats.items():
+            per_pass.setdefault(name, PassStats()).add(stats)
+            per_module.setdefault(module, PassStats()).add(stats)
+        total = sum(stats.seconds for stats in per_pass.values())
+
+        lines = ["===== Normalization passes =====", format_stats_header("pass")]
+        for name, stats in sorted(per_pass.items(), key=lambda item: -item[1].seconds):
+            lines.append(format_stats(name, stats, total))
+        lines.append("")
+        lines.append(format_stats_header("module"))
+        for module, stats in sorted(per_module.items(), key=lambda item: -item[1].seconds):
+            lines.append(format_stats(module, stats, total))
+        lines.append(f"total: {total * 1000:.3f} ms")
+        return "\n".join(lines)
+
+
+def format_stats_header(title: str) -> str:
+    return f"{'time, ms':>10} {'%':>6} {'nodes':>10} {'+blocks':>10}  {title}"
+
+
+def format_stats(title: str, stats: PassStats, total: float) -> str:
+    percent = 100 * stats.seconds / total if total > 0 else 0
+    return f"{stats.seconds * 1000:10.3f} {percent:6.1f} {stats.nodes:10} {stats.allocated_blocks:10}  {title}"
@@ -2,26 +2,20 @@ from typing import Union, List, cast
 
 from src.ast import Module, AstWalker, Scope, Decl, FunDecl, IdentExpr, VarDecl, Import, FunCall, Node, Literal, \
     StmtBlock, builtin_declarations, Entrypoint, AstTransformer, Expr, DotExpr
-from src.ast.fixverify import set_parents
 from src.ast.utils import is_top_level, fancy_pos, outerscope
 from src.context.compilation_ctx import CompilationCtx
-from src.context.error_ctx import CompilationInterrupted
 from src.ty import TyModule
 
 
-def resolve(compiler: CompilationCtx, mod: Module):
-    reorder_top_level_decls(mod)
+def check_constants(compiler: CompilationCtx, mod: Module) -> Module:
     mod.accept(CheckConstants(compiler), None)
-    if compiler.has_errors():
-        raise CompilationInterrupted()
-    v = ResolverTransformer(compiler)
-    mod = mod.accept(v, None)
-    if compiler.has_errors():
-        raise CompilationInterrupted()
-    set_parents(mod)
     return mod
 
 
+def resolve_names(compiler: CompilationCtx, mod: Module) -> Module:
+    return mod.accept(ResolverTransformer(compiler), None)
+
+
 def reorder_top_level_decls(m: Module):
     imports: List[Decl] = [d for d in m.top_level_decls if isinstance(d, Import)]
     vars = [d for d in m.top_level_decls if isinstance(d, VarDecl)]
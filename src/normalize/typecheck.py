@@ -8,11 +8,13 @@ from src.normalize.function_termination_check import FunctionTerminationChecker
 from src.ty import TyUnknown, TyInt, Ty, TyBool, TyVoid, TyFunc, TyBuiltin, TyStr, TySpecial
 
 
-def typecheck(ctx: CompilationCtx, mod: Module):
-    v = TypeCheckVisitor(ctx)
-    v.walk(mod)
-    v = FunctionTerminationChecker(ctx)
-    v.visit(mod, None)
+def typecheck(ctx: CompilationCtx, mod: Module) -> Module:
+    TypeCheckVisitor(ctx).walk(mod)
+    return mod
+
+
+def check_function_termination(ctx: CompilationCtx, mod: Module) -> Module:
+    FunctionTerminationChecker(ctx).visit(mod, None)
     return mod
 
 
@@ -1,19 +1,107 @@
+import contextlib
 from pathlib import Path
-
-from antlr4 import FileStream, CommonTokenStream
+from typing import TYPE_CHECKING
 
 from src.ast import Module
 from src.ast.fixverify import set_parents
 from src.context.compilation_ctx import CompilationCtx
-from src.context.error_ctx import CompilationInterrupted
-from src.parser.error_listener import HerbErrorListener
-from src.parser.generated.HerbLexer import HerbLexer
-from src.parser.generated.HerbParser import HerbParser
-from src.parser.parser import HerbParserVisitor
+from src.context.error_ctx import CompilationInterrupted, CompilationError
+from src.defs.constants import PARSER_ANTLR
+from src.parser.lexer import map_source, tokenize
+from src.parser.native_parser import NativeParser, ParseFailed
+from src.span import Span
+
+if TYPE_CHECKING:
+    from antlr4 import InputStream
+    from src.parser.generated.HerbParser import HerbParser
 
 
 def parse(compiler: CompilationCtx, path: Path) -> Module:
+    if compiler.options.parser == PARSER_ANTLR:
+        return parse_antlr(compiler, path)
+    return parse_native(compiler, path)
+
+
+def parse_native(compiler: CompilationCtx, path: Path) -> Module:
+    errors = []
+
+    def add_error(span: Span, message: str):
+        errors.append(CompilationError(filepath=path, span=span, message=message, hint="this is a parsing error."))
+
+    # the source is lexed as the parser asks for the tokens, only the text of the names and literals is decoded
+    with map_source(path) as source, contextlib.closing(tokenize(source, add_error)) as tokens:
+        parser = NativeParser(path, tokens)
+        mod = None
+        try:
+            mod = parser.parse_module()
+        except ParseFailed as e:
+            add_error(e.span, e.message)
+            # lexical errors after the syntax error are reported too, like ANTLR does
+            for _ in tokens:
+                pass
+    if len(errors) > 0:
+        for error in sorted(errors, key=lambda err: (err.span.line, err.span.column)):
+            compiler.add_error(error)
+        raise CompilationInterrupted()
+    for error in parser.errors:
+        compiler.add_error(error)
+    set_parents(mod)
+    return mod
+
+
+def parse_antlr(compiler: CompilationCtx, path: Path) -> Module:
+    """
+    Parses in two stages: the cheap SLL prediction gives up on the first error, and only then the input is parsed
+    again with full LL prediction, which reports the errors. SLL parses the same valid input as LL
+    unless the grammar needs full context to tell the alternatives apart, which falls back to LL too.
+    """
+    # the ANTLR runtime and the generated parser take a while to import
+    from antlr4 import FileStream
+    from src.parser.parser import HerbParserVisitor
+
     input_stream = FileStream(str(path), encoding='utf-8')
+    tree = parse_antlr_sll(input_stream)
+    if tree is None:
+        input_stream.reset()
+        tree = parse_antlr_ll(compiler, path, input_stream)
+    mod = tree.accept(HerbParserVisitor(path, compiler))
+    set_parents(mod)
+    return mod
+
+
+def parse_antlr_sll(input_stream: 'InputStream') -> 'HerbParser.ProgContext | None':
+    """
+    :return: None if the input has errors or needs full LL prediction, nothing is reported
+    """
+    from antlr4 import CommonTokenStream, PredictionMode
+    from antlr4.error.ErrorStrategy import BailErrorStrategy
+    from antlr4.error.Errors import ParseCancellationException
+    from src.parser.error_listener import SilentErrorListener
+    from src.parser.generated.HerbLexer import HerbLexer
+    from src.parser.generated.HerbParser import HerbParser
+
+    lexer_errors = SilentErrorListener()
+    lexer = HerbLexer(input_stream)
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(lexer_errors)
+    parser = HerbParser(CommonTokenStream(lexer))
+    parser.removeErrorListeners()
+    parser._errHandler = BailErrorStrategy()
+    parser._interp.predictionMode = PredictionMode.SLL
+    try:
+        tree = parser.prog()
+    except ParseCancellationException:
+        return None
+    # the lexer skips unknown characters, the parser may succeed without them
+    return tree if not lexer_errors.has_errors else None
+
+
+def parse_antlr_ll(compiler: CompilationCtx, path: Path, input_stream: 'InputStream') -> 'HerbParser.ProgContext':
+    from antlr4 import CommonTokenStream
+    from src.parser.error_listener import HerbErrorListener
+    from src.parser.generated.HerbLexer import HerbLexer
+    from src.parser.generated.HerbParser import HerbParser
+
     error_listener = HerbErrorListener(compiler, path)
     lexer = HerbLexer(input_stream)
     lexer.removeErrorListeners()
@@ -27,6 +115,4 @@ def parse(compiler: CompilationCtx, path: Path) -> Module:
     tree = parser.prog()
     if error_listener.has_errors:
         raise CompilationInterrupted()
-    mod = tree.accept(HerbParserVisitor(path, compiler))
-    set_parents(mod)
-    return mod
+    return tree
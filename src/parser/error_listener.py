@@ -21,3 +21,14 @@ class HerbErrorListener(ErrorListener):
             hint="this is a parsing error."
         ))
         self.has_errors = True
+
+
+class SilentErrorListener(ErrorListener):
+    """
+    Only remembers that there were errors, they are reported when the input is parsed once more.
+    """
+    def __init__(self):
+        self.has_errors = False
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.has_errors = True
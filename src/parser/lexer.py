@@ -0,0 +1,157 @@
+import contextlib
+import mmap
+import re
+from pathlib import Path
+from typing import Callable, Iterator
+
+from src.span import Span
+
+# kinds of the tokens that are not keywords or punctuation, the kind of those is their text
+IDENT = "IDENT"
+INT_LITERAL = "INT_LITERAL"
+BOOL_LITERAL = "BOOL_LITERAL"
+STRINGLITERAL = "STRINGLITERAL"
+EOF = "<EOF>"
+
+KEYWORDS = frozenset(["import", "as", "fn", "var", "entrypoint", "if", "else", "while", "return"])
+BOOL_LITERALS = frozenset(["true", "false"])
+PUNCTUATION = frozenset(["->", "<=", "==", "!=", ">=", "&&", "||", *";.(),=:-!*/%&+|<>{}"])
+
+# the kinds of the identifiers and the punctuation by their bytes, they are known without decoding the text
+IDENT_KINDS = {**{word.encode(): word for word in KEYWORDS}, **{word.encode(): BOOL_LITERAL for word in BOOL_LITERALS}}
+PUNCTUATION_KINDS = {p.encode(): p for p in PUNCTUATION}
+
+# a token of Herb.g4 and the whitespace before it, the longest match wins.
+# At the end of the source only EOF matches, on an unknown character only the empty ERROR
+TOKEN_RE = re.compile(rb"""
+    [ \n\t\r]*
+    (?:
+        (?P<IDENT>[a-zA-Z_][a-zA-Z_0-9]*)
+        | (?P<INT_LITERAL>[0-9]+)
+        | (?P<STRINGLITERAL>"[^"\\\r\n]*")
+        | (?P<PUNCT>->|<=|==|!=|>=|&&|\|\||[;.(),=:\-!*/%&+|<>{}])
+        | (?P<EOF>\Z)
+        | (?P<ERROR>)
+    )
+""", re.VERBOSE)
+# an unterminated string literal, it fails on the character after the match
+BROKEN_STRING_RE = re.compile(rb'"[^"\\\r\n]*')
+
+
+class Token:
+    """
+    The text of a token is not copied out of the source until it is asked for.
+    """
+    __slots__ = ("kind", "source", "start", "end", "line", "column")
+
+    def __init__(self, kind: str, source: bytes | mmap.mmap, start: int, end: int, line: int, column: int):
+        self.kind = kind
+        self.source = source
+        self.start = start  # byte offsets in the source
+        self.end = end
+        self.line = line
+        self.column = column  # in code points, like in ANTLR
+
+    @property
+    def text(self) -> str:
+        return self.source[self.start:self.end].decode("utf-8")
+
+    def span(self) -> Span:
+        return Span(line=self.line, column=self.column)
+
+    def display(self) -> str:
+        return f"'{EOF}'" if self.kind == EOF else f"'{escape(self.text)}'"
+
+    def __repr__(self):
+        return f"{self.kind}({self.text!r}) at {self.line}:{self.column}"
+
+
+def escape(text: str) -> str:
+    return text.replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
+
+
+@contextlib.contextmanager
+def map_source(path: Path) -> Iterator[bytes | mmap.mmap]:
+    """
+    Maps the file into memory instead of reading it, the tokens must not be used after the file is closed.
+    """
+    with open(path, "rb") as f:
+        # an empty file cannot be mapped
+        if f.seek(0, 2) == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            yield source
+
+
+def code_point_length(lead_byte: int) -> int:
+    """
+    :return: number of bytes of the UTF-8 encoded code point that starts with the byte
+    """
+    if lead_byte < 0xC0:
+        return 1
+    if lead_byte < 0xE0:
+        return 2
+    if lead_byte < 0xF0:
+        return 3
+    return 4
+
+
+def tokenize(source: bytes | mmap.mmap, on_error: Callable[[Span, str], None]) -> Iterator[Token]:
+    """
+    Splits the UTF-8 encoded source into the tokens of Herb.g4 as they are read, whitespace is skipped.
+    Lines start from 1, columns from 0 and count code points, like in ANTLR.
+    Newlines are not translated, a lone '\\r' does not start a line, like in ANTLR.
+    Unknown characters are reported and skipped the way the ANTLR lexer skips them,
+    so both parsers see the same tokens.
+    The iterator holds the source, it must be closed before a mapped file is closed.
+    :param on_error: called with the position and the message of every lexical error
+    """
+    line = 1
+    line_start = 0
+    # bytes of the current line that continue a multibyte code point, the columns are that much shorter
+    line_continuations = 0
+    pos = 0
+    while True:
+        for m in TOKEN_RE.finditer(source, pos):
+            kind = m.lastgroup
+            start, end = m.span(m.lastindex)
+            if start != pos:
+                newline = source.rfind(b"\n", pos, start)
+                if newline >= 0:
+                    line += source[pos:start].count(b"\n")
+                    line_start = newline + 1
+                    line_continuations = 0
+            pos = end
+            column = start - line_start - line_continuations
+            if kind == IDENT:
+                kind = IDENT_KINDS.get(source[start:end], IDENT)
+            elif kind == "PUNCT":
+                kind = PUNCTUATION_KINDS[source[start:end]]
+            elif kind == STRINGLITERAL:
+                literal = source[start:end]
+                if not literal.isascii():
+                    line_continuations += len(literal) - len(literal.decode("utf-8"))
+            elif kind == "EOF":
+                yield Token(EOF, source, start, end, line, column)
+                return
+            elif kind == "ERROR":
+                break
+            yield Token(kind, source, start, end, line, column)
+        # ANTLR reports the characters up to the one it failed on, including it, and continues after them
+        broken = BROKEN_STRING_RE.match(source, pos)
+        if broken is not None:
+            skip_to = min(broken.end() + 1, len(source))
+        else:
+            skip_to = min(pos + code_point_length(source[pos]), len(source))
+        text = source[pos:skip_to].decode("utf-8")
+        on_error(Span(line=line, column=pos - line_start - line_continuations),
+                 f"token recognition error at: '{escape(text)}'")
+        if text.endswith("\n"):
+            # an unterminated string literal fails on the end of its line
+            line += 1
+            line_start = skip_to
+            line_continuations = 0
+        else:
+            line_continuations += (skip_to - pos) - len(text)
+        pos = skip_to
@@ -0,0 +1,374 @@
+from pathlib import Path
+from typing import Iterator, List
+
+from src.ast import Import, Module, Stmt, FunDecl, ExprStmt, IntLiteral, FunCall, Expr, Decl, VarDecl, IdentExpr, \
+    BoolLiteral, StrLiteral, AssignStmt, BinopExpr, BinopKind, StmtBlock, IfStmt, WhileStmt, UnopExpr, UnopKind, \
+    ArgDecl, RetStmt, Entrypoint, DotExpr
+from src.context.error_ctx import CompilationError
+from src.parser.lexer import Token, IDENT, INT_LITERAL, BOOL_LITERAL, STRINGLITERAL, EOF
+from src.span import Span
+from src.ty import Ty, TyFunc, TyVoid, ty_primitive_by_name
+
+# precedence of the binary operators in Herb.g4, all of them are left-associative
+BINOP_PRECEDENCE = {
+    "*": 5, "/": 5, "%": 5, "&": 5,
+    "+": 4, "-": 4, "|": 4,
+    "<": 3, "<=": 3, "==": 3, "!=": 3, ">": 3, ">=": 3,
+    "&&": 2,
+    "||": 1,
+}
+# the operand of an unary operator binds tighter than any binary operator, but not than calls and member accesses
+UNOP_OPERAND_PRECEDENCE = 6
+
+EXPR_FIRST = ["(", "-", "!", STRINGLITERAL, BOOL_LITERAL, INT_LITERAL, IDENT]
+STMT_FIRST = ["var", "if", "while", "return", *EXPR_FIRST]
+TOP_LEVEL_FIRST = [EOF, "fn", "var", "entrypoint"]
+
+
+class ParseFailed(Exception):
+    span: Span
+    message: str
+
+    def __init__(self, span: Span, message: str):
+        super().__init__(message)
+        self.span = span
+        self.message = message
+
+
+def token_name(kind: str) -> str:
+    return kind if kind in (IDENT, INT_LITERAL, BOOL_LITERAL, STRINGLITERAL, EOF) else f"'{kind}'"
+
+
+class ExprFrame:
+    """
+    An operand being parsed, the call of expr() that parses it in the recursive formulation.
+    """
+    __slots__ = ("start", "min_precedence", "left", "op", "args")
+
+    def __init__(self, start: Token, min_precedence: int):
+        self.start = start  # the first token, the span of the nodes built from the operand
+        self.min_precedence = min_precedence
+        self.left: Expr | None = None
+        self.op: Token | None = None  # the binary operator whose right operand is being parsed
+        self.args: List[Expr] | None = None  # the arguments of the call being parsed
+
+
+class NativeParser:
+    """
+    Recursive descent parser of Herb.g4 that parses expressions by precedence climbing
+    and builds the AST directly, without a parse tree.
+    The nodes and their spans are the same as HerbParserVisitor builds from the ANTLR parse tree:
+    a node starts at its first token, so a binary expression with a parenthesized left operand starts at the '('.
+    Parsing stops at the first syntax error, at the token where ANTLR reports its first one.
+    """
+    path: Path
+    tokens: Iterator[Token]  # the tokens after the current one, ends with EOF
+    token: Token
+    errors: List[CompilationError]  # errors of a syntactically valid module, like unknown types
+
+    def __init__(self, path: Path, tokens: Iterator[Token]):
+        self.path = path
+        self.errors = []
+        self.tokens = tokens
+        self.token = next(tokens)
+
+    # ===== TOKENS =====
+
+    def advance(self) -> Token:
+        token = self.token
+        if token.kind != EOF:
+            self.token = next(self.tokens)
+        return token
+
+    def expect(self, kind: str, expected: List[str] | None = None) -> Token:
+        if self.token.kind != kind:
+            self.fail(expected if expected is not None else [kind])
+        return self.advance()
+
+    def fail(self, expected: List[str]):
+        names = [token_name(kind) for kind in expected]
+        expecting = names[0] if len(names) == 1 else "{" + ", ".join(names) + "}"
+        raise ParseFailed(self.token.span(), f"mismatched input {self.token.display()} expecting {expecting}")
+
+    # ===== DECLARATIONS =====
+
+    def parse_module(self) -> Module:
+        imports = []
+        while self.token.kind == "import":
+            imports.append(self.import_decl())
+        declarations: List[Decl] = []
+        entrypoints: List[Entrypoint] = []
+        while self.token.kind != EOF:
+            kind = self.token.kind
+            if kind == "fn":
+                declarations.append(self.func_decl())
+            elif kind == "var":
+                declarations.append(self.var_decl())
+            elif kind == "entrypoint":
+                entrypoints.append(self.entrypoint_decl())
+            elif len(declarations) == 0 and len(entrypoints) == 0:
+                self.fail(["import", *TOP_LEVEL_FIRST])
+            else:
+                self.fail(TOP_LEVEL_FIRST)
+        for entry in entrypoints[1:]:
+            self.errors.append(CompilationError(
+                filepath=self.path,
+                span=entry.span,
+                message=f"Entrypoint is already defined in this module ({self.path}:{entrypoints[0].span})",
+                hint=""
+            ))
+        return Module(
+            imports=imports,
+            top_level_decls=declarations,
+            path=self.path,
+            entry=entrypoints[0] if len(entrypoints) != 0 else None,
+            span=Span(0, 0)
+        )
+
+    def import_decl(self) -> Import:
+        start = self.expect("import")
+        is_relative = self.token.kind == "."
+        if is_relative:
+            self.advance()
+        path = [self.expect(IDENT, [".", IDENT] if not is_relative else None).text]
+        while self.token.kind == ".":
+            self.advance()
+            path.append(self.expect(IDENT).text)
+        alias = ""
+        if self.token.kind == "as":
+            self.advance()
+            alias = self.expect(IDENT).text
+            self.expect(";")
+        else:
+            self.expect(";", [";", ".", "as"])
+        return Import(alias=alias, path=tuple(path), is_relative=is_relative, span=start.span())
+
+    def entrypoint_decl(self) -> Entrypoint:
+        start = self.expect("entrypoint")
+        return Entrypoint(block=self.block(), span=start.span())
+
+    def func_decl(self) -> FunDecl:
+        start = self.expect("fn")
+        name = self.expect(IDENT).text
+        self.expect("(")
+        args = []
+        if self.token.kind == IDENT:
+            args.append(self.arg_decl())
+            while self.token.kind == ",":
+                self.advance()
+                args.append(self.arg_decl())
+        self.expect(")", [",", ")"] if len(args) > 0 else [")", IDENT])
+        ret_ty = TyVoid
+        if self.token.kind == "->":
+            self.advance()
+            ret_ty = self.typ()
+        elif self.token.kind != "{":
+            self.fail(["->", "{"])
+        return FunDecl(name=name, args=args, body=self.block(), ret_ty=ret_ty, span=start.span())
+
+    def arg_decl(self) -> ArgDecl:
+        name = self.expect(IDENT)
+        self.expect(":")
+        return ArgDecl(name=name.text, ty=self.typ(), span=name.span())
+
+    def var_decl(self) -> VarDecl:
+        start = self.expect("var")
+        name = self.expect(IDENT).text
+        self.expect("=")
+        initializer = self.expr()
+        self.expect(";")
+        return VarDecl(name=name, initializer=initializer, span=start.span())
+
+    # ===== STATEMENTS =====
+
+    def block(self) -> StmtBlock:
+        start = self.expect("{")
+        statements = []
+        while self.token.kind != "}":
+            statements.append(self.stmt())
+        self.advance()
+        return StmtBlock(stmts=statements, span=start.span())
+
+    def stmt(self) -> Stmt:
+        kind = self.token.kind
+        if kind == "var":
+            return self.var_decl()
+        if kind == "if":
+            return self.if_stmt()
+        if kind == "while":
+            return self.while_stmt()
+        if kind == "return":
+            return self.ret_stmt()
+        if kind not in EXPR_FIRST:
+            self.fail([*STMT_FIRST, "}"])
+        start = self.token
+        expr = self.expr()
+        if self.token.kind == "=":
+            self.advance()
+            rvalue = self.expr()
+            self.expect(";")
+            return AssignStmt(lvalue=expr, rvalue=rvalue, span=start.span())
+        self.expect(";", [";", "="])
+        return ExprStmt(expr=expr, span=start.span())
+
+    def if_stmt(self) -> IfStmt:
+        # else-if chains are flattened into the branches of the first if
+        start = self.expect("if")
+        condition_branches = [(self.expr(), self.block())]
+        else_branch = None
+        while self.token.kind == "else":
+            self.advance()
+            if self.token.kind == "if":
+                self.advance()
+                condition_branches.append((self.expr(), self.block()))
+            elif self.token.kind == "{":
+                else_branch = self.block()
+                break
+            else:
+                self.fail(["if", "{"])
+        return IfStmt(condition_branches=condition_branches, else_branch=else_branch, span=start.span())
+
+    def while_stmt(self) -> WhileStmt:
+        start = self.expect("while")
+        cond = self.expr()
+        return WhileStmt(cond=cond, body=self.block(), span=start.span())
+
+    def ret_stmt(self) -> RetStmt:
+        start = self.expect("return")
+        expr = None
+        if self.token.kind in EXPR_FIRST:
+            expr = self.expr()
+            self.expect(";")
+        else:
+            self.expect(";", [";", *EXPR_FIRST])
+        return RetStmt(expr=expr, span=start.span())
+
+    # ===== EXPRESSIONS =====
+
+    def expr(self, min_precedence: int = 0) -> Expr:
+        """
+        Parses an expression whose binary operators have at least min_precedence by precedence climbing.
+        Instead of recursing into the operands, their frames are kept on an explicit stack, together with
+        the '(' and the unary operators in front of them, so neither long chains of operators
+        nor deeply nested parentheses are limited by the Python stack.
+        """
+        stack: List[ExprFrame | Token] = [ExprFrame(self.token, min_precedence)]
+        while True:
+            value = self.operand(stack)
+            # the operand is returned to the enclosing frames until one of them needs the next operand
+            while True:
+                top = stack[-1]
+                if type(top) is Token:
+                    stack.pop()
+                    if top.kind == "(":
+                        self.expect(")")
+                    else:
+                        value = UnopExpr(expr=value, kind=UnopKind(top.kind), span=top.span())
+                    continue
+                if top.left is None:
+                    top.left = value
+                elif top.args is not None:
+                    top.args.append(value)
+                    if self.token.kind == ",":
+                        self.advance()
+                        stack.append(ExprFrame(self.token, 0))
+                        break
+                    self.expect(")", [",", ")"])
+                    top.left = FunCall(callee=top.left, args=top.args, span=top.start.span())
+                    top.args = None
+                else:
+                    top.left = BinopExpr(left=top.left, right=value, kind=BinopKind(top.op.kind),
+                                         span=top.start.span())
+                next_frame = self.operators(top)
+                if next_frame is not None:
+                    stack.append(next_frame)
+                    break
+                stack.pop()
+                value = top.left
+                if len(stack) == 0:
+                    return value
+
+    def operators(self, frame: 'ExprFrame') -> 'ExprFrame | None':
+        """
+        Applies the member accesses and calls after the left operand of the frame.
+        :return: the frame of the next operand, of a binary operator or of a call argument,
+            None if the expression of the frame ends
+        """
+        while True:
+            kind = self.token.kind
+            if kind == ".":
+                self.advance()
+                name = self.expect(IDENT).text
+                frame.left = DotExpr(receiver=frame.left, name=name, span=frame.start.span())
+            elif kind == "(":
+                self.advance()
+                if self.token.kind != ")":
+                    frame.args = []
+                    return ExprFrame(self.token, 0)
+                self.advance()
+                frame.left = FunCall(callee=frame.left, args=[], span=frame.start.span())
+            else:
+                precedence = BINOP_PRECEDENCE.get(kind)
+                if precedence is None or precedence < frame.min_precedence:
+                    return None
+                frame.op = self.advance()
+                return ExprFrame(self.token, precedence + 1)
+
+    def operand(self, stack: List['ExprFrame | Token']) -> Expr:
+        """
+        Parses a literal or a name, the '(' and the unary operators before it are pushed on the stack
+        with the frames of the expressions they enclose.
+        """
+        while True:
+            token = self.token
+            kind = token.kind
+            if kind == INT_LITERAL:
+                self.advance()
+                return IntLiteral(value=int(token.source[token.start:token.end]), span=token.span())
+            if kind == IDENT:
+                self.advance()
+                return IdentExpr(name=token.text, span=token.span())
+            if kind == BOOL_LITERAL:
+                self.advance()
+                return BoolLiteral(value=(token.text == "true"), span=token.span())
+            if kind == STRINGLITERAL:
+                self.advance()
+                return StrLiteral(value=token.source[token.start + 1:token.end - 1].decode("utf-8"), span=token.span())
+            if kind == "(":
+                self.advance()
+                stack.append(token)
+                stack.append(ExprFrame(self.token, 0))
+            elif kind == "-" or kind == "!":
+                self.advance()
+                stack.append(token)
+                stack.append(ExprFrame(self.token, UNOP_OPERAND_PRECEDENCE))
+            else:
+                self.fail(EXPR_FIRST)
+
+    # ===== TYPES =====
+
+    def typ(self) -> Ty | None:
+        token = self.token
+        if token.kind == IDENT:
+            self.advance()
+            name = token.text
+            if name in ty_primitive_by_name:
+                return ty_primitive_by_name[name]
+            allowed_types = ', '.join(str(ty) for ty in ty_primitive_by_name.values())
+            self.errors.append(CompilationError(
+                filepath=self.path,
+                message=f"Unknown type '{name}'",
+                hint=f"Allowed types: {allowed_types}.",
+                span=token.span()
+            ))
+            return None
+        self.expect("(", ["(", IDENT])
+        types = []
+        if self.token.kind != ")":
+            types.append(self.typ())
+            while self.token.kind == ",":
+                self.advance()
+                types.append(self.typ())
+        self.expect(")", [",", ")"] if len(types) > 0 else None)
+        self.expect("->")
+        return TyFunc(args=types, ret=self.typ())
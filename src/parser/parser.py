@@ -1,9 +1,9 @@
 from pathlib import Path
-from typing import Tuple
+from typing import List, Tuple
 
 from src.ast import Import, Module, Stmt, FunDecl, ExprStmt, IntLiteral, FunCall, Expr, Decl, VarDecl, Scope, IdentExpr, \
     BoolLiteral, StrLiteral, AssignStmt, BinopExpr, BinopKind, StmtBlock, IfStmt, WhileStmt, UnopExpr, UnopKind, \
-    ArgDecl, RetStmt, Entrypoint, fancy_pos, DotExpr
+    ArgDecl, RetStmt, Entrypoint, DotExpr
 from src.context.compilation_ctx import CompilationCtx
 from src.context.error_ctx import CompilationError
 from src.span import Span, INVALID_SPAN
@@ -21,6 +21,19 @@ def get_all(get, start_i=0):
     return result
 
 
+def expr_operands(ctx: HerbParser.ExprContext) -> List[HerbParser.ExprContext]:
+    if isinstance(ctx, HerbParser.BinopExprContext):
+        return [ctx.expr(0), ctx.expr(1)]
+    if isinstance(ctx, (HerbParser.ParenExprContext, HerbParser.UnaryopExprContext)):
+        return [ctx.expr()]
+    if isinstance(ctx, HerbParser.FunCallContext):
+        args = ctx.commaSeparatedExprs()
+        return [ctx.callee, *(get_all(args.expr) if args is not None else [])]
+    if isinstance(ctx, HerbParser.DotExprContext):
+        return [ctx.receiver]
+    return []
+
+
 class HerbParserVisitor(HerbVisitor):
     def __init__(self, filepath: Path, compiler: CompilationCtx):
         self.filepath = filepath
@@ -32,10 +45,13 @@ class HerbParserVisitor(HerbVisitor):
         declarations = [self.visit(n) for n in get_all(ctx.topLevelDecl)]
         entrypoints = [self.visit(n) for n in get_all(ctx.entrypointDecl)]
         for entry in entrypoints[1:]:
-            self.compiler.add_error_to_node(
-                node=entry,
-                message=f"Entrypoint is already defined in this module ({fancy_pos(entrypoints[0])})"
-            )
+            # the nodes have no parents yet, so the module cannot be found from them
+            self.compiler.add_error(CompilationError(
+                filepath=self.filepath,
+                span=entry.span,
+                message=f"Entrypoint is already defined in this module ({self.filepath}:{entrypoints[0].span})",
+                hint=""
+            ))
         return Module(
             imports=imports,
             top_level_decls=declarations,
@@ -85,23 +101,48 @@ class HerbParserVisitor(HerbVisitor):
 
     # ===== EXPRESSIONS =====
 
+    def build_expr(self, root: HerbParser.ExprContext) -> Expr:
+        """
+        Builds the expression bottom-up with an explicit stack instead of visiting the parse tree recursively,
+        so neither long chains of operators nor deeply nested parentheses are limited by the Python stack.
+        """
+        built: List[Expr] = []
+        stack: List[Tuple[HerbParser.ExprContext, List[HerbParser.ExprContext] | None]] = [(root, None)]
+        while len(stack) > 0:
+            ctx, operands = stack.pop()
+            if operands is None:
+                operands = expr_operands(ctx)
+                stack.append((ctx, operands))
+                stack.extend((operand, None) for operand in reversed(operands))
+                continue
+            values = built[len(built) - len(operands):]
+            del built[len(built) - len(operands):]
+            built.append(self.make_expr(ctx, values))
+        return built[0]
+
+    def make_expr(self, ctx: HerbParser.ExprContext, operands: List[Expr]) -> Expr:
+        if isinstance(ctx, HerbParser.BinopExprContext):
+            return BinopExpr(left=operands[0], right=operands[1], kind=BinopKind(ctx.op.text),
+                             span=Span.from_antlr(ctx))
+        if isinstance(ctx, HerbParser.ParenExprContext):
+            return operands[0]
+        if isinstance(ctx, HerbParser.UnaryopExprContext):
+            return UnopExpr(expr=operands[0], kind=UnopKind(ctx.op.text), span=Span.from_antlr(ctx))
+        if isinstance(ctx, HerbParser.FunCallContext):
+            return FunCall(callee=operands[0], args=operands[1:], span=Span.from_antlr(ctx))
+        if isinstance(ctx, HerbParser.DotExprContext):
+            return DotExpr(receiver=operands[0], name=str(ctx.IDENT()), span=Span.from_antlr(ctx))
+        # literals and references have no operands
+        return self.visit(ctx)
+
     def visitParenExpr(self, ctx:HerbParser.ParenExprContext):
-        return self.visit(ctx.expr())
+        return self.build_expr(ctx)
 
     def visitBinopExpr(self, ctx:HerbParser.BinopExprContext):
-        return BinopExpr(
-            left=self.visit(ctx.expr(0)),
-            right=self.visit(ctx.expr(1)),
-            kind=BinopKind(ctx.op.text),
-            span=Span.from_antlr(ctx)
-        )
+        return self.build_expr(ctx)
 
     def visitUnaryopExpr(self, ctx:HerbParser.UnaryopExprContext):
-        return UnopExpr(
-            expr=self.visit(ctx.expr()),
-            kind=UnopKind(ctx.op.text),
-            span=Span.from_antlr(ctx)
-        )
+        return self.build_expr(ctx)
 
     def visitIntLit(self, ctx: HerbParser.IntLitContext):
         return IntLiteral(value=int(ctx.getText()), span=Span.from_antlr(ctx))
@@ -116,21 +157,13 @@ class HerbParserVisitor(HerbVisitor):
         return StrLiteral(value=text, span=Span.from_antlr(ctx))
 
     def visitFunCall(self, ctx: HerbParser.FunCallContext):
-        return FunCall(
-            callee=self.visit(ctx.callee),
-            args=[arg for arg in self.visit(ctx.commaSeparatedExprs())] if ctx.commaSeparatedExprs() is not None else [],
-            span=Span.from_antlr(ctx),
-        )
+        return self.build_expr(ctx)
 
     def visitReference(self, ctx: HerbParser.ReferenceContext):
         return IdentExpr(name=str(ctx.IDENT()), span=Span.from_antlr(ctx))
 
     def visitDotExpr(self, ctx:HerbParser.DotExprContext):
-        return DotExpr(
-            receiver=self.visit(ctx.receiver),
-            name=str(ctx.IDENT()),
-            span=Span.from_antlr(ctx)
-        )
+        return self.build_expr(ctx)
 
     # ===== STATEMENTS =====
 
@@ -200,19 +233,11 @@ class HerbParserVisitor(HerbVisitor):
 
     def visitTypFunc(self, ctx:HerbParser.TypFuncContext):
         types = [self.visit(ty) for ty in get_all(lambda i: ctx.typ(i))]
-        assert len(types) > 1
+        assert len(types) > 0
         return TyFunc(args=types[:-1], ret=types[-1])
 
     # ===== UTIL =====
 
-    def visitCommaSeparatedExprs(self, ctx: HerbParser.CommaSeparatedExprsContext):
-        exprs = []
-        i = 0
-        while (exprCtx := ctx.expr(i)) is not None:
-            i += 1
-            exprs.append(self.visit(exprCtx))
-        return exprs
-
     def visitRelImportPath(self, ctx: HerbParser.RelImportPathContext) -> Tuple[bool, Tuple[str]]:
         path = []
         i = 0
@@ -0,0 +1,85 @@
+import cProfile
+import contextlib
+import dataclasses
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+COMPILER_LANE = "compiler"  # phases of the whole compilation, the phases of a module get a lane of their own
+
+PSTATS_FILE_EXT = ".prof"
+TRACE_FILE_EXT = ".trace.json"
+
+
+@dataclasses.dataclass
+class TraceEvent:
+    name: str
+    lane: str
+    start: float  # seconds since the profiler was created
+    duration: float
+
+
+class Profiler:
+    """
+    Runs the phases of the compiler under cProfile and records them in a timeline.
+    The functions are profiled together, the timeline tells how long every phase of every module took.
+    """
+    profile: cProfile.Profile
+    events: List[TraceEvent]
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.events = []
+        self.__origin = time.perf_counter()
+        self.__depth = 0
+
+    @contextlib.contextmanager
+    def phase(self, name: str, lane: str = COMPILER_LANE) -> Iterator[None]:
+        """
+        Phases can be nested, for example modules are parsed while the program is loaded.
+        """
+        start = time.perf_counter()
+        if self.__depth == 0:
+            self.profile.enable()
+        self.__depth += 1
+        try:
+            yield
+        finally:
+            self.__depth -= 1
+            if self.__depth == 0:
+                self.profile.disable()
+            self.events.append(TraceEvent(name, lane, start - self.__origin, time.perf_counter() - start))
+
+    def save(self, prefix: Path) -> List[Path]:
+        """
+        Writes the pstats file, for pstats or snakeviz, and the timeline, for speedscope or chrome://tracing.
+        :param prefix: path of the files without the extensions
+        :return: the written files
+        """
+        stats_path = prefix.with_name(prefix.name + PSTATS_FILE_EXT)
+        trace_path = prefix.with_name(prefix.name + TRACE_FILE_EXT)
+        prefix.parent.mkdir(parents=True, exist_ok=True)
+        self.profile.dump_stats(stats_path)
+        with open(trace_path, "w") as f:
+            json.dump(self.trace(), f)
+        return [stats_path, trace_path]
+
+    def trace(self) -> dict:
+        """
+        The timeline in the Chrome trace event format, every lane is a thread.
+        """
+        events = sorted(self.events, key=lambda e: e.start)
+        lanes: Dict[str, int] = {COMPILER_LANE: 0}
+        for e in events:
+            lanes.setdefault(e.lane, len(lanes))
+        pid = os.getpid()
+        trace = []
+        for lane, tid in lanes.items():
+            trace.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": lane}})
+            trace.append({"name": "thread_sort_index", "ph": "M", "pid": pid, "tid": tid, "args": {"sort_index": tid}})
+        for e in events:
+            trace.append({"name": e.name, "ph": "X", "pid": pid, "tid": lanes[e.lane],
+                          "ts": e.start * 1e6, "dur": e.duration * 1e6})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
@@ -1,6 +1,8 @@
 import dataclasses
+from typing import TYPE_CHECKING
 
-from antlr4 import ParserRuleContext
+if TYPE_CHECKING:
+    from antlr4 import ParserRuleContext
 
 
 @dataclasses.dataclass()
@@ -12,7 +14,7 @@ class Span:
         return f"{self.line}:{self.column}"
 
     @staticmethod
-    def from_antlr(ctx: ParserRuleContext) -> 'Span':
+    def from_antlr(ctx: 'ParserRuleContext') -> 'Span':
         return Span(
             line=ctx.start.line,
             column=ctx.start.column,
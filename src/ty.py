@@ -41,6 +41,11 @@ TyUnknown = TySpecial(name="unknown")
 TyBuiltin = TySpecial(name="builtin")
 TyEntry = TySpecial(name="entry")
 
+ty_special_by_name = dict()
+
+for ty in [TyUnknown, TyBuiltin, TyEntry]:
+    ty_special_by_name[ty.name] = ty
+
 TyVoid = TyPrimitive(name="void")
 TyInt = TyPrimitive(name="int")
 TyBool = TyPrimitive(name="bool")
@@ -52,6 +57,14 @@ for ty in [TyVoid, TyInt, TyBool, TyStr]:
     ty_primitive_by_name[ty.name] = ty
 
 
+def special_ty(name: str) -> TySpecial:
+    return ty_special_by_name[name]
+
+
+def primitive_ty(name: str) -> TyPrimitive:
+    return ty_primitive_by_name[name]
+
+
 class TyFunc(Ty):
     args: 'List[Ty]'
     ret: 'Ty'
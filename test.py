@@ -1,20 +1,38 @@
 import dataclasses
 import io
 import os.path
+import shutil
 import subprocess
 import sys
+import tempfile
+import time
 import traceback
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
 from pathlib import Path
-from typing import Union, List, Tuple
+from typing import Dict, Union, List, Tuple
+from unittest import mock
 from contextlib import redirect_stdout
 
-from main import run_compiler, RT_PATH, HERB_STD_PATH
+from main import run_compiler, run_batch_compiler, run_checker, run_library_compiler, compile_jit, create_compiler, RT_PATH, \
+    HERB_STD_PATH
+from src.ast import Node
+from src.context.error_ctx import CompilationInterrupted
+from src.context.options_ctx import OptionsCtx
+from src.defs.constants import PARSERS, PARSER_NATIVE, RECURSION_LIMIT, DAEMON_SOCKET_ENV, DAEMON_SOCKET_NAME
+from src.cache.ast_cache import dump_module, load_module
+from src.loader import Loader
+from src.parser import parse
+from src.library.manifest import load_manifest, manifest_path
 
 test_data_dir = Path("test") / "data"
 test_data_build = test_data_dir / "build"
+batch_test_dir = Path("test") / "batch"  # programs compiled together, some of them import others
 build_dir = Path("build")
-temp_program_path = build_dir / "testprog"
+tests_build_dir = build_dir / "tests"  # every test has its own build directory and executable in it
+std_library_path = tests_build_dir / "libherb" / "libherb.a"
+DAEMON_CLIENT_PATH = "herbc_client.py"
 runtime_path: Path
 herb_std_path: Path
 
@@ -34,6 +52,7 @@ class TestRun:
     actual_typ: TestType
     stdout: str = ""
     stderr: str = ""
+    duration: float = 0.0  # seconds
 
     def is_successful(self) -> bool:
         return self.expected_typ == self.actual_typ
@@ -54,10 +73,14 @@ class TestRun:
 class Test:
     path: Path
     typ: TestType
+    options: OptionsCtx | None
+    jit: bool  # the program is executed in the test process instead of being linked and started
 
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, options: OptionsCtx | None = None, jit: bool = False):
         assert path.is_file()
         self.path = path
+        self.options = options
+        self.jit = jit
         stem = path.stem
         if "_nc_" in stem:
             self.typ = TestType.CompileTimeError
@@ -66,30 +89,63 @@ class Test:
         else:
             self.typ = TestType.Positive
 
+    @property
+    def name(self) -> str:
+        return self.path.stem + ("-lib" if self.options is not None and len(self.options.libraries) > 0 else "")
+
     def run(self) -> TestRun:
+        start = time.perf_counter()
         actual_typ, stdout, stderr = self.__run()
-        return TestRun(path=self.path, expected_typ=self.typ, actual_typ=actual_typ, stdout=stdout, stderr=stderr)
+        return TestRun(path=self.path, expected_typ=self.typ, actual_typ=actual_typ, stdout=stdout, stderr=stderr,
+                       duration=time.perf_counter() - start)
 
     def __run(self) -> Tuple[TestType, str, str]:
+        test_build_dir = tests_build_dir / self.name
+        program_path = test_build_dir / self.name
+        # tests run in parallel, so a test does not compile in parallel itself
+        options = dataclasses.replace(self.options or OptionsCtx(), build_dir=test_build_dir, jobs=1)
+        # a program that crashes would take the test process down with it
+        jit = self.jit and self.typ != TestType.RuntimeError
+        parsers_diff = compare_parsers(self.path)
+        if parsers_diff is not None:
+            return TestType.CompilerCrashed, "", f"ERROR: {parsers_diff}"
+        loaders_diff = compare_loaders(self.path)
+        if loaders_diff is not None:
+            return TestType.CompilerCrashed, "", f"ERROR: {loaders_diff}"
         compiler_out = io.StringIO()
         with redirect_stdout(compiler_out):
             try:
-                ok = run_compiler(self.path, temp_program_path)
+                checked = run_checker([self.path], options)
+                if jit:
+                    program = compile_jit(self.path, options)
+                    ok = program is not None
+                else:
+                    ok = run_compiler(self.path, program_path, options)
             except Exception as e:
                 return TestType.CompilerCrashed, "", traceback.format_exc()
+        if checked != ok:
+            if jit and ok:
+                program.close()
+            return TestType.CompilerCrashed, compiler_out.getvalue(), "ERROR: --check disagrees with the compiler"
 
         if not ok:
             return TestType.CompileTimeError, compiler_out.getvalue(), ""
-        result = subprocess.run([], executable=temp_program_path, text=True, capture_output=True)
-        ok = result.returncode == 0
-        if not ok:
-            return TestType.RuntimeError, result.stdout, result.stderr
+        if jit:
+            program_out = io.StringIO()
+            with program, redirect_stdout(program_out):
+                program.run()
+            returncode, stdout, stderr = 0, program_out.getvalue(), ""
+        else:
+            result = subprocess.run([], executable=program_path, text=True, capture_output=True)
+            returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
+        if returncode != 0:
+            return TestType.RuntimeError, stdout, stderr
         expected_output = self.__load_expected_stdout()
         if expected_output is None:
             return TestType.IncorrectOutput, "ERROR: Could not open stdout file", ""
-        if result.stdout != expected_output:
-            return TestType.IncorrectOutput, result.stdout, result.stderr
-        return TestType.Positive, result.stdout, result.stderr
+        if stdout != expected_output:
+            return TestType.IncorrectOutput, stdout, stderr
+        return TestType.Positive, stdout, stderr
 
     def __load_expected_stdout(self) -> Union[str, None]:
         path = self.path.parent / (self.path.stem + ".stdout")
@@ -98,30 +154,244 @@ class Test:
         return path.read_text(encoding="utf-8")
 
 
-def find_tests() -> List[Test]:
-    return [Test(p) for p in test_data_dir.glob("*.herb")]
+def compare_parsers(path: Path) -> str | None:
+    """
+    Every parser must build the same AST or report its first error at the same position,
+    and the AST must stay the same after it is stored in the AST cache and loaded back.
+    :return: what differs, None if the parsers agree
+    """
+    results = dict()
+    for parser in PARSERS:
+        compiler = create_compiler(path.parent, OptionsCtx(parser=parser))
+        try:
+            mod = parse(compiler, path)
+            tree = ast_signature(mod)
+        except CompilationInterrupted:
+            tree = None
+        if tree is not None and ast_signature(load_module(dump_module(mod), path)) != tree:
+            return f"the AST built by the {parser} parser changes when it is loaded from the AST cache"
+        first_error = min((e.span.line, e.span.column) for e in compiler.errors.errors) \
+            if compiler.has_errors() else None
+        results[parser] = (tree, first_error)
+    reference, (tree, first_error) = next(iter(results.items()))
+    for parser, (other_tree, other_first_error) in results.items():
+        if other_tree != tree:
+            return f"the {parser} parser builds a different AST than the {reference} one"
+        if other_first_error != first_error:
+            return f"the first error of the {parser} parser is at {other_first_error}, " \
+                   f"but the {reference} one reports it at {first_error}"
+    return None
+
+
+def compare_loaders(path: Path) -> str | None:
+    """
+    Loading the program with files parsed by worker processes must give the same modules, in the same order,
+    and the same errors as parsing them one by one.
+    :return: what differs, None if the loaders agree
+    """
+    results = dict()
+    for jobs in (1, 2):
+        compiler = create_compiler(path.parent, OptionsCtx(use_cache=False, jobs=jobs))
+        loader = Loader(compiler)
+        try:
+            # the workers are started on a single CPU too
+            with mock.patch("src.loader.usable_cpus", return_value=jobs):
+                loader.load_file(path)
+            modules = tuple((str(mod.path), ast_signature(mod)) for mod in loader.get_loaded_modules())
+        except CompilationInterrupted:
+            modules = None
+        errors = tuple((str(e.filepath), str(e.span), e.message) for e in compiler.errors.errors)
+        results[jobs] = (modules, errors)
+    if results[1][0] != results[2][0]:
+        return "the modules loaded with several jobs differ from the ones loaded with one job"
+    if results[1][1] != results[2][1]:
+        return f"the errors reported with several jobs differ: {results[2][1]} instead of {results[1][1]}"
+    return None
+
+
+def ast_signature(value) -> object:
+    """
+    Comparable form of a parsed AST: node classes, spans and fields, without node ids and parents.
+    """
+    if isinstance(value, Node):
+        fields = sorted((name, ast_signature(v)) for name, v in vars(value).items() if name not in ("id", "parent"))
+        return type(value).__name__, str(value.span), tuple(fields)
+    if isinstance(value, (list, tuple)):
+        return tuple(ast_signature(v) for v in value)
+    if isinstance(value, dict):
+        return tuple((k, ast_signature(v)) for k, v in value.items())
+    return str(value)
+
+
+def run_batch_test(parser: str) -> TestRun:
+    """
+    Compiles the programs of test/batch at once, one of them is imported by another one.
+    """
+    start = time.perf_counter()
+    typ, stdout, stderr = check_batch(parser)
+    return TestRun(path=batch_test_dir, expected_typ=TestType.Positive, actual_typ=typ, stdout=stdout, stderr=stderr,
+                   duration=time.perf_counter() - start)
+
+
+def check_batch(parser: str) -> Tuple[TestType, str, str]:
+    test_build_dir = tests_build_dir / "batch"
+    entries = sorted(batch_test_dir.glob("*.herb"))
+    programs = [(entry, test_build_dir / entry.stem) for entry in entries]
+    compiler_out = io.StringIO()
+    with redirect_stdout(compiler_out):
+        try:
+            ok = run_batch_compiler(programs, OptionsCtx(parser=parser, build_dir=test_build_dir, jobs=1))
+        except Exception:
+            return TestType.CompilerCrashed, compiler_out.getvalue(), traceback.format_exc()
+    if not ok:
+        return TestType.CompileTimeError, compiler_out.getvalue(), ""
+    for entry, program_path in programs:
+        result = subprocess.run([], executable=program_path, text=True, capture_output=True)
+        if result.returncode != 0:
+            return TestType.RuntimeError, result.stdout, result.stderr
+        if result.stdout != entry.with_suffix(".stdout").read_text(encoding="utf-8"):
+            return TestType.IncorrectOutput, result.stdout, f"ERROR: wrong output of {entry}"
+    return TestType.Positive, "", ""
+
+
+def run_daemon_test(parser: str) -> TestRun:
+    """
+    Compiles a program and a program with errors with the client, first through the daemon and then in the client,
+    once the daemon is stopped.
+    """
+    start = time.perf_counter()
+    socket_dir = Path(tempfile.mkdtemp(prefix="herbc-test-"))
+    env = {**os.environ, DAEMON_SOCKET_ENV: str(socket_dir / DAEMON_SOCKET_NAME)}
+    daemon = subprocess.Popen([sys.executable, "-u", "main.py", "--daemon"], env=env, text=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    try:
+        typ, stdout, stderr = check_daemon(daemon, env, parser)
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+    return TestRun(path=Path(DAEMON_CLIENT_PATH), expected_typ=TestType.Positive, actual_typ=typ, stdout=stdout,
+                   stderr=stderr, duration=time.perf_counter() - start)
+
+
+def check_daemon(daemon: subprocess.Popen, env: Dict[str, str], parser: str) -> Tuple[TestType, str, str]:
+    socket_path = Path(env[DAEMON_SOCKET_ENV])
+    started = daemon.stdout.readline()
+    if not socket_path.exists():
+        return TestType.CompilerCrashed, started + daemon.stdout.read(), "ERROR: the daemon did not start"
+    second = subprocess.run([sys.executable, "main.py", "--daemon"], env=env, text=True, capture_output=True)
+    if second.returncode == 0 or "already listening" not in second.stdout:
+        return TestType.CompilerCrashed, second.stdout, "ERROR: a second daemon started on the same socket"
+
+    program = test_data_dir / "002_print_int.herb"
+    program_path = tests_build_dir / "daemon" / program.stem
+    program_path.parent.mkdir(parents=True, exist_ok=True)
+    with_error = test_data_dir / "090_nc_missing_semicolon.herb"
+    for mode in ("daemon", "untrusted", "no daemon"):
+        if mode == "untrusted":
+            # the client must not use a socket that others could have created
+            socket_path.parent.chmod(0o777)
+        elif mode == "no daemon":
+            socket_path.parent.chmod(0o700)
+            daemon.terminate()
+            daemon.wait()
+        program_path.unlink(missing_ok=True)
+        client = [sys.executable, DAEMON_CLIENT_PATH, "--parser", parser]
+        result = subprocess.run([*client, str(program), str(program_path)], env=env, text=True, capture_output=True)
+        if result.returncode != 0 or not program_path.is_file():
+            return TestType.CompilerCrashed, result.stdout, f"ERROR: the client failed with {mode}:\n{result.stderr}"
+        if ("WARNING" in result.stderr) != (mode == "untrusted"):
+            return TestType.CompilerCrashed, result.stdout, f"ERROR: unexpected warnings with {mode}:\n{result.stderr}"
+        run = subprocess.run([], executable=program_path, text=True, capture_output=True)
+        expected = program.with_suffix(".stdout").read_text(encoding="utf-8")
+        if run.stdout != expected:
+            return TestType.IncorrectOutput, run.stdout, f"ERROR: wrong output of the program compiled with {mode}"
+        result = subprocess.run([*client, "--check", str(with_error)], env=env, text=True, capture_output=True)
+        if result.returncode == 0 or str(with_error) not in result.stdout:
+            return TestType.CompilerCrashed, result.stdout, f"ERROR: the error is not reported with {mode}"
+    if socket_path.exists():
+        return TestType.CompilerCrashed, "", "ERROR: the stopped daemon did not remove its socket"
+    return TestType.Positive, "", ""
+
+
+def find_tests(jit: bool, parser: str) -> List[Test]:
+    return [Test(p, OptionsCtx(parser=parser), jit=jit) for p in sorted(test_data_dir.glob("*.herb"))]
+
+
+def find_library_tests(parser: str) -> List[Test]:
+    """
+    Tests that use the standard library are run once more, linked against its prebuilt version.
+    """
+    library_options = OptionsCtx(parser=parser, build_dir=std_library_path.parent)
+    if not run_library_compiler(HERB_STD_PATH, std_library_path, library_options):
+        print("FAIL: could not build the standard library\n")
+        exit(1)
+    options = OptionsCtx(parser=parser, libraries=[load_manifest(manifest_path(std_library_path))])
+    return [Test(p, options) for p in sorted(test_data_dir.glob("*.herb"))
+            if "import herb." in p.read_text(encoding="utf-8") and "_nc_" not in p.stem]
+
+
+def run_test(test: Test) -> TestRun:
+    return test.run()
+
+
+def print_durations(results: List[TestRun], n_slowest: int):
+    """
+    :param n_slowest: number of the slowest tests to list, all tests are listed if it is 0
+    """
+    slowest = sorted(results, key=lambda r: r.duration, reverse=True)
+    if n_slowest > 0:
+        slowest = slowest[:n_slowest]
+    print(f"SLOWEST TESTS ({len(slowest)} of {len(results)}, {sum(r.duration for r in results):.2f}s in total)")
+    for r in slowest:
+        print(f"{r.duration:8.3f}s  {r.path}{'' if r.is_successful() else '  FAIL'}")
+    print()
 
 
 def main():
     global runtime_path
     runtime_path = Path(os.path.abspath(__file__)).parent / "runtime"
+    sys.setrecursionlimit(RECURSION_LIMIT)
 
-    build_dir.mkdir(exist_ok=True)
+    argparser = ArgumentParser(description="Compile and run every test/data/*.herb")
+    argparser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                           help="number of tests run in parallel")
+    argparser.add_argument("--durations", type=int, default=10, metavar="N",
+                           help="list the N slowest tests, 0 lists all of them")
+    argparser.add_argument("--parser", choices=PARSERS, default=PARSER_NATIVE,
+                           help="parser the programs are compiled with, every test also checks that "
+                                "all parsers agree")
+    argparser.add_argument("--jit", action="store_true",
+                           help="execute the programs in memory instead of linking executables, "
+                                "tests against prebuilt libraries and of runtime errors are still linked")
+    args = argparser.parse_args()
+    if args.jobs < 1:
+        print(f"ERROR: --jobs must be positive, but was {args.jobs}")
+        exit(1)
+
+    tests_build_dir.mkdir(parents=True, exist_ok=True)
 
     print("TESTING STARTED\n")
 
-    n_tests = 0
-    n_passed = 0
+    start = time.perf_counter()
+    tests = find_tests(args.jit, args.parser) + find_library_tests(args.parser)
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(run_test, tests))
+    else:
+        results = [run_test(test) for test in tests]
+    results.append(run_batch_test(args.parser))
+    results.append(run_daemon_test(args.parser))
+    elapsed = time.perf_counter() - start
 
-    for test in find_tests():
-        n_tests += 1
-        result = test.run()
-        if result.is_successful():
-            n_passed += 1
-        else:
+    for result in results:
+        if not result.is_successful():
             print(result, "\n")
+    print_durations(results, args.durations)
 
-    print(f"TOTAL {n_tests} | SUCCESS {n_passed} | FAIL {n_tests - n_passed}")
+    n_tests = len(results)
+    n_passed = sum(1 for result in results if result.is_successful())
+    print(f"TOTAL {n_tests} | SUCCESS {n_passed} | FAIL {n_tests - n_passed} | {elapsed:.2f}s with {args.jobs} jobs")
     if n_passed < n_tests:
         print("FAIL!")
         exit(1)